@@ -0,0 +1,68 @@
+"""Benchmark the Minkabu news extraction against the full BeautifulSoup tree on saved html.
+
+Usage:
+    python benchmarks/bench_minkabu_html.py [--number 200]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import fscraper as fs  # noqa: E402
+from fixture_transport import FixtureTransport, read_fixture  # noqa: E402
+
+
+def full_tree_news(content):
+    """The previous extraction, building the whole tree with "html.parser"."""
+    soup = BeautifulSoup(content, "html.parser")
+    return {
+        'title': soup.select("div[class='md_index_article fsize_l']")[0].get_text('\n').strip(),
+        'publish_time': soup.select("div[class='flr']")[0].get_text('\n').strip()[3:],
+        'article': soup.select("div[class='md_box fsize_m md_normalize']")[0].get_text('\n').strip(),
+    }
+
+
+def full_tree_abstract(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return [cell.find("a", href=True)['href'] for cell in soup.select("div[class='cell']")[1:]]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--number', type=int, default=200, help='iterations of each case')
+    args = arg_parser.parse_args()
+
+    article = read_fixture('minkabu_news_article.html')
+    news_list = read_fixture('minkabu_news_list.html')
+    query = {'id': '3800000', 'href': '/stock/7203/news/3800000'}
+
+    parsers = ['html.parser']
+    if fs.minkabuscraper.HTML_PARSER == 'lxml':
+        parsers.append('lxml')
+
+    cases = [('get_news_contents', 'full tree, html.parser', lambda: full_tree_news(article))]
+    for parser in parsers:
+        ms = fs.MinkabuScraper('7203.T', transport=FixtureTransport(), parser=parser)
+        news = ms.get_news_contents([query], sleep=0)[0]
+        expected = full_tree_news(article)
+        assert all(news[k] == v for k, v in expected.items()), f"{parser}: output differs from the full tree"
+        cases.append(('get_news_contents', f'strainer, {parser}',
+                      lambda ms=ms: ms.get_news_contents([query], sleep=0)))
+
+    cases.append(('get_news_abstract', 'full tree, html.parser', lambda: full_tree_abstract(news_list)))
+    for parser in parsers:
+        ms = fs.MinkabuScraper('7203.T', transport=FixtureTransport(), parser=parser)
+        assert [q['href'] for q in ms.get_news_abstract()] == full_tree_abstract(news_list)
+        cases.append(('get_news_abstract', f'strainer, {parser}', ms.get_news_abstract))
+
+    print(f"{'method':<20}{'path':<26}{'ms/page':>10}")
+    for method, path, func in cases:
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        print(f"{method:<20}{path:<26}{elapsed * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Serve the recorded responses in `benchmarks/fixtures` instead of the real sites."""
+
+import os
+import re
+import requests
+from requests.structures import CaseInsensitiveDict
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# URL pattern -> fixture file
+ROUTES = [
+    (r'query2\.finance\.yahoo\.com/v8/finance/chart/', 'yahoo_chart.json'),
+    (r'query2\.finance\.yahoo\.com/ws/fundamentals-timeseries/', 'yahoo_timeseries.json'),
+    (r'kabutan\.jp/stock/read', 'kabutan_minutes.csv'),
+    (r'img-sec\.ifis\.co\.jp/graph/stock_chart_tp/', 'kabuyoho_target_price.js'),
+    (r'assets\.minkabu\.jp/jsons/stock-jam/stocks/.+/lump\.json', 'minkabu_lump.json'),
+    (r'minkabu\.jp/stock/.+/news$', 'minkabu_news_list.html'),
+    (r'minkabu\.jp/stock/.+/news/', 'minkabu_news_article.html'),
+]
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+class FixtureTransport(object):
+    """Drop-in replacement of `fscraper.Transport` answering from the fixtures.
+
+    Attributes:
+        overrides(dict): fixture file -> body, for serving scaled payloads
+    """
+
+    def __init__(self, overrides: dict = None):
+        self.overrides = dict(overrides or {})
+        self._bodies = dict()
+
+    def get(self, url, params=None, headers=None, timeout=None, validate=None) -> requests.Response:
+        for pattern, name in ROUTES:
+            if re.search(pattern, url):
+                break
+        else:
+            raise ValueError(f"No fixture for {url}")
+
+        if name in self.overrides:
+            body = self.overrides[name]
+        else:
+            if name not in self._bodies:
+                self._bodies[name] = read_fixture(name)
+            body = self._bodies[name]
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({'Last-Modified': 'Wed, 31 Jan 2024 09:00:00 GMT'})
+        response._content = body
+
+        return response
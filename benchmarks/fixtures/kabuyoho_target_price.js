@@ -0,0 +1 @@
+tp7203([{"name":"PBR","data":[{"low":2150.5,"high":3390.2}]},{"name":"PER","data":[{"low":2280.1,"high":3612.8}]},{"name":"株価","data":[{"x":1706659200000,"y":2895.0}]},{"name":"理論株価(PBR)","data":[{"x":1706659200000,"y":2771.0}]},{"name":"dummy","data":[{"x":1706659200000,"y":0}]},{"name":"理論株価(PER)","data":[{"x":1706659200000,"y":3010.0}]},{"name":"dummy","data":[{"x":1706659200000,"y":0}]},{"name":"目標株価","data":[{"x":1706659200000,"y":3250.0}]}])
\ No newline at end of file
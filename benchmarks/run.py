@@ -0,0 +1,452 @@
+"""Offline micro-benchmarks of the scraper parsers and the indicators.
+
+The scrapers are fed with the recorded responses in `benchmarks/fixtures`(scaled to the input size
+where the payload is a time series, up to 1M rows), so no request is sent. Each case reports the best
+wall time and the peak memory(tracemalloc), and is compared against the stored baseline.
+
+The timings are compared relative to a calibration workload timed before each case(and stored with
+the baseline), so that a slower or busier machine doesn't report every case as a regression. A slower
+case is measured again up to `--attempts` times before being reported, and cases faster than
+`--min-seconds` are too noisy for their time to be judged, only their memory is.
+
+Usage:
+    python benchmarks/run.py                           # compare against benchmarks/baseline.json
+    python benchmarks/run.py --sizes 1000 100000       # only some of the sizes
+    python benchmarks/run.py --filter rsi --filter macd
+    python benchmarks/run.py --save-baseline           # store the results as the new baseline
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import fscraper as fs  # noqa: E402
+from fixture_transport import FixtureTransport, read_fixture  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+# Largest size of the scrapers, whose scaled text payloads(and the parsed objects) don't fit in memory at 10M rows
+PAYLOAD_MAX_SIZE = 1_000_000
+
+# name -> (setup, scalable, max_size), `setup(size)` returns the function to measure
+CASES = dict()
+
+
+def case(name, scalable=True, max_size=None):
+    def register(setup):
+        CASES[name] = (setup, scalable, max_size)
+        return setup
+    return register
+
+
+def random_walk(size, seed=0):
+    rng = np.random.default_rng(seed)
+    close = pd.Series(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, size))))
+    high = close * (1 + rng.uniform(0, 0.01, size))
+    low = close * (1 - rng.uniform(0, 0.01, size))
+    volume = pd.Series(rng.integers(0, 100_000, size))
+    return high, low, close, volume
+
+
+# Scaled payloads
+def scaled_chart(size):
+    chart = json.loads(read_fixture('yahoo_chart.json'))
+    result = chart['chart']['result'][0]
+    reps = -(-size // len(result['timestamp']))
+    result['timestamp'] = [result['timestamp'][0] + 60 * i for i in range(size)]
+    quote = result['indicators']['quote'][0]
+    for key in quote:
+        quote[key] = (quote[key] * reps)[:size]
+    result['events']['dividends'] = {
+        str(ts): {'amount': 30.0, 'date': ts} for ts in result['timestamp'][::max(size // 20, 1)]}
+    return json.dumps(chart).encode()
+
+
+def scaled_kabutan_csv(size):
+    lines = read_fixture('kabutan_minutes.csv').decode().splitlines()
+    header, rows = lines[0], [line.split(',') for line in lines[1:]]
+    dates = pd.date_range('2000-01-01', periods=size, freq='min')
+    times = dates.strftime('%y/%m/%d/%H:%M')
+    days = dates.strftime('%Y.%m.%d')
+    body = [header]
+    for i in range(size):
+        row = rows[i % len(rows)]
+        body.append(','.join([times[i], *row[1:6], days[i], *row[7:]]))
+    return '\n'.join(body).encode()
+
+
+def scaled_lump(size):
+    lump = json.loads(read_fixture('minkabu_lump.json'))
+    reps = -(-size // len(lump['dates']))
+    lump['dates'] = list(pd.date_range('1990-01-01', periods=size, freq='min').strftime('%Y/%m/%d %H:%M'))
+    for series in (lump['stock'], lump['n225'], lump['usdjpy']):
+        for key in series:
+            series[key] = (series[key] * reps)[:size]
+    return json.dumps(lump).encode()
+
+
+# Scrapers
+@case('YahooFinanceScraper.get_stock_price', max_size=PAYLOAD_MAX_SIZE)
+def bench_yahoo_price(size):
+    yfs = fs.YahooFinanceScraper('7203.T', transport=FixtureTransport({'yahoo_chart.json': scaled_chart(size)}))
+    return lambda: yfs.get_stock_price(period='max', interval='1m')
+
+
+@case('YahooFinanceScraper.get_financials', scalable=False)
+def bench_yahoo_financials(size):
+    yfs = fs.YahooFinanceScraper('7203.T', transport=FixtureTransport())
+    return lambda: yfs.get_financials('balancesheet', 'annual')
+
+
+@case('YahooFinanceScraper.get_all_financials', scalable=False)
+def bench_yahoo_all_financials(size):
+    yfs = fs.YahooFinanceScraper('7203.T', transport=FixtureTransport())
+    return yfs.get_all_financials
+
+
+@case('KabutanScraper.get_stock_price_by_minutes', max_size=PAYLOAD_MAX_SIZE)
+def bench_kabutan_minutes(size):
+    kt = fs.KabutanScraper('7203.T', transport=FixtureTransport({'kabutan_minutes.csv': scaled_kabutan_csv(size)}))
+    return kt.get_stock_price_by_minutes
+
+
+@case('KabuyohoScraper.get_target_price', scalable=False)
+def bench_kabuyoho_target_price(size):
+    ky = fs.KabuyohoScraper('7203.T', transport=FixtureTransport())
+    return ky.get_target_price
+
+
+@case('KabuyohoScraper.get_target_prices', scalable=False)
+def bench_kabuyoho_target_prices(size):
+    codes = [str(code) for code in range(1300, 1400)]
+    return lambda: fs.KabuyohoScraper.get_target_prices(codes, transport=FixtureTransport())
+
+
+@case('MinkabuScraper.get_analysis', max_size=PAYLOAD_MAX_SIZE)
+def bench_minkabu_analysis(size):
+    mk = fs.MinkabuScraper('7203.T', transport=FixtureTransport({'minkabu_lump.json': scaled_lump(size)}))
+    return mk.get_analysis
+
+
+@case('MinkabuScraper.get_analysis(compact=True)', max_size=PAYLOAD_MAX_SIZE)
+def bench_minkabu_analysis_compact(size):
+    mk = fs.MinkabuScraper('7203.T', transport=FixtureTransport({'minkabu_lump.json': scaled_lump(size)}))
+    return lambda: mk.get_analysis(compact=True)
+
+
+@case('MinkabuScraper.get_bulk_analysis', scalable=False)
+def bench_minkabu_bulk_analysis(size):
+    codes = [str(code) for code in range(1300, 1400)]
+    return lambda: fs.MinkabuScraper.get_bulk_analysis(codes, transport=FixtureTransport())
+
+
+@case('MinkabuScraper.get_news_abstract', scalable=False)
+def bench_minkabu_news_abstract(size):
+    mk = fs.MinkabuScraper('7203.T', transport=FixtureTransport())
+    return mk.get_news_abstract
+
+
+@case('MinkabuScraper.get_news_contents', scalable=False)
+def bench_minkabu_news_contents(size):
+    mk = fs.MinkabuScraper('7203.T', transport=FixtureTransport())
+    query = {'id': '3800000', 'href': '/stock/7203/news/3800000'}
+    return lambda: mk.get_news_contents([query], sleep=0)
+
+
+# Storage
+@case('PriceStore.load')
+def bench_store_load(size):
+    high, low, close, volume = random_walk(size)
+    prices = pd.DataFrame({'high': high, 'low': low, 'close': close, 'volume': volume})
+    prices.index = pd.date_range('2000-01-01', periods=size, freq='min', tz='Asia/Tokyo', name='date')
+    store = fs.PriceStore(tempfile.mkdtemp())
+    store.append('7203.T', '1m', prices)
+    return lambda: store.load('7203.T', '1m', start='2000-01-01 12:00')
+
+
+# Alignment
+def minute_bars(size):
+    high, low, close, volume = random_walk(size)
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume}).set_axis(
+        pd.date_range('2000-01-01', periods=size, freq='min', tz='Asia/Tokyo', name='date'))
+
+
+@case('resample_ohlcv(5m)')
+def bench_resample(size):
+    bars = minute_bars(size)
+    return lambda: fs.resample_ohlcv(bars, '5m')
+
+
+@case('Resampler.resample(5m, 1h, 1d)')
+def bench_resampler(size):
+    bars = minute_bars(size)
+
+    def run():
+        resampler = fs.Resampler(bars)
+        for rule in ['5m', '1h', '1d', '5m', '1h', '1d']:
+            resampler.resample(rule)
+    return run
+
+
+@case('asof_join')
+def bench_asof_join(size):
+    bars = minute_bars(size)
+    daily = fs.resample_ohlcv(bars, '1d')[['close']].rename(columns={'close': 'daily_close'})
+    return lambda: fs.asof_join(bars, daily)
+
+
+# Indicators
+@case('calculate_rsi')
+def bench_rsi(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_rsi(close)
+
+
+@case('calculate_rsi(engine=numba)')
+def bench_rsi_numba(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_rsi(close, engine='numba')
+
+
+@case('calculate_rsi(wilder, engine=numba)')
+def bench_rsi_wilder_numba(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_rsi(close, wilder=True, engine='numba')
+
+
+@case('calculate_stochastic_oscillator')
+def bench_stochastic_oscillator(size):
+    high, low, close, _ = random_walk(size)
+    return lambda: fs.calculate_stochastic_oscillator(high, low, close)
+
+
+@case('calculate_stochastic_oscillator(engine=numba)')
+def bench_stochastic_oscillator_numba(size):
+    high, low, close, _ = random_walk(size)
+    return lambda: fs.calculate_stochastic_oscillator(high, low, close, engine='numba')
+
+
+@case('calculate_bollinger_bands')
+def bench_bollinger_bands(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_bollinger_bands(close)
+
+
+@case('calculate_macd')
+def bench_macd(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_macd(close)
+
+
+@case('calculate_macd(engine=numba)')
+def bench_macd_numba(size):
+    _, _, close, _ = random_walk(size)
+    return lambda: fs.calculate_macd(close, engine='numba')
+
+
+@case('get_x_days_high_low')
+def bench_x_days_high_low(size):
+    high, low, _, _ = random_walk(size)
+    return lambda: fs.get_x_days_high_low(high, low, window=20)
+
+
+@case('get_x_days_high_low(window=1000)')
+def bench_x_days_high_low_large_window(size):
+    high, low, _, _ = random_walk(size)
+    return lambda: fs.get_x_days_high_low(high, low, window=1000)
+
+
+@case('get_x_days_high_low(window=1000, engine=numba)')
+def bench_x_days_high_low_numba(size):
+    high, low, _, _ = random_walk(size)
+    return lambda: fs.get_x_days_high_low(high, low, window=1000, engine='numba')
+
+
+@case('calculate_obv')
+def bench_obv(size):
+    _, _, close, volume = random_walk(size)
+    return lambda: fs.calculate_obv(close, volume)
+
+
+@case('calculate_pearson_correlation')
+def bench_pearson_correlation(size):
+    _, _, close1, _ = random_walk(size, seed=1)
+    _, _, close2, _ = random_walk(size, seed=2)
+    return lambda: fs.calculate_pearson_correlation(close1, close2)
+
+
+@case('calculate_beta')
+def bench_beta(size):
+    index = pd.date_range('1990-01-01', periods=size, freq='min').strftime('%Y-%m-%d %H:%M')
+    _, _, stock, _ = random_walk(size, seed=1)
+    _, _, benchmark, _ = random_walk(size, seed=2)
+    stock.index = benchmark.index = index
+    return lambda: fs.calculate_beta(stock, benchmark, end='9999-12-31')
+
+
+@case('calculate_rolling_beta')
+def bench_rolling_beta(size):
+    # 50 stocks, `size` prices in total
+    rng = np.random.default_rng(0)
+    rows = max(size // 50, 2)
+    stocks = pd.DataFrame(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, (rows, 50)), axis=0)))
+    _, _, benchmark, _ = random_walk(rows)
+    return lambda: fs.calculate_rolling_beta(stocks, benchmark, window=[60, 250])
+
+
+@case('calculate_correlation_matrix')
+def bench_correlation_matrix(size):
+    # 100 stocks, `size` prices in total
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, (max(size // 100, 2), 100)), axis=0)))
+    return lambda: fs.calculate_correlation_matrix(prices, block_size=32)
+
+
+@case('get_top_correlated')
+def bench_top_correlated(size):
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, (max(size // 100, 2), 100)), axis=0)))
+    return lambda: fs.get_top_correlated(prices, k=5, block_size=32)
+
+
+def best_time(func, repeat=5, min_time=0.5, max_repeat=50):
+    """Best wall time of at least `repeat` runs, repeated for `min_time` seconds(up to `max_repeat` runs).
+
+    Like `timeit`, the garbage collector is disabled during the runs, its pauses are the main noise
+    of the object-heavy parsers.
+    """
+    timings = []
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        while len(timings) < repeat or (time.perf_counter() - start < min_time and len(timings) < max_repeat):
+            t0 = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - t0)
+    finally:
+        if enabled:
+            gc.enable()
+    return min(timings)
+
+
+def measure_memory(func):
+    """Peak memory of one traced run."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def calibrate():
+    """Time a fixed NumPy/pandas workload, the unit of the compared timings.
+
+    It is timed again before each case, so that the unit follows the speed of the machine during the run.
+    """
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.normal(0, 1, 100_000))
+    numbers = values.iloc[:5_000].tolist()
+
+    def run():
+        values.rolling(20).mean()
+        np.sort(values.to_numpy())
+        json.loads(json.dumps(numbers))
+
+    return best_time(run, repeat=5, min_time=0.1)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='input sizes in rows')
+    arg_parser.add_argument('--filter', action='append', default=[], help='only run the cases containing the text')
+    arg_parser.add_argument('--baseline', default=BASELINE, help='baseline file to compare with')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    arg_parser.add_argument('--tolerance', type=float, default=0.3,
+                            help='allowed slowdown/memory growth ratio before reporting a regression')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='minimum number of timed runs of a case')
+    arg_parser.add_argument('--min-time', type=float, default=0.5, help='minimum seconds of timed runs of a case')
+    arg_parser.add_argument('--min-seconds', type=float, default=0.005,
+                            help='cases faster than this are not judged on their time')
+    arg_parser.add_argument('--attempts', type=int, default=3,
+                            help='calibrated measurements of a slower case before reporting it, '
+                                 'or of every case for the baseline(the median is stored)')
+    args = arg_parser.parse_args()
+
+    baseline = dict()
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    runs = []
+    for name, (setup, scalable, max_size) in CASES.items():
+        if args.filter and not any(text in name for text in args.filter):
+            continue
+        if not scalable:
+            runs.append((name, setup, None))
+            continue
+        runs.extend((f"{name}[{size}]", setup, size) for size in args.sizes if max_size is None or size <= max_size)
+
+    width = max([len(key) for key, _, _ in runs] + [4]) + 2
+    results = dict()
+    regressions = []
+    print(f"{'case':<{width}}{'seconds':>12}{'peak MiB':>10}  vs baseline(time, memory)")
+    for key, setup, size in runs:
+        func = setup(size)
+        base = baseline.get(key)
+
+        # (seconds, calibration) of each attempt, the calibration is timed right before the case
+        attempts = []
+        time_ratio = None
+        while len(attempts) < args.attempts:
+            calibration = calibrate()
+            attempts.append((best_time(func, args.repeat, args.min_time), calibration))
+            if args.save_baseline or base is None:
+                continue
+            # Relative to the calibration of each run, the baselines saved without one are compared as is
+            seconds, calibration = attempts[-1]
+            ratio = (seconds / calibration) / (base['seconds'] / base.get('calibration', calibration))
+            time_ratio = ratio if time_ratio is None else min(time_ratio, ratio)
+            if time_ratio <= 1 + args.tolerance or max(seconds, base['seconds']) < args.min_seconds:
+                break
+
+        if args.save_baseline:
+            attempts.sort(key=lambda attempt: attempt[0] / attempt[1])
+            seconds, calibration = attempts[len(attempts) // 2]
+        else:
+            seconds, calibration = min(attempts, key=lambda attempt: attempt[0] / attempt[1])
+        peak = measure_memory(func)
+        results[key] = {'seconds': seconds, 'peak_bytes': peak, 'calibration': calibration}
+
+        comparison = ''
+        if base is not None and time_ratio is not None:
+            memory_ratio = peak / max(base['peak_bytes'], 1)
+            comparison = f"x{time_ratio:.2f}, x{memory_ratio:.2f}"
+            slower = time_ratio > 1 + args.tolerance and max(seconds, base['seconds']) >= args.min_seconds
+            if slower or memory_ratio > 1 + args.tolerance:
+                comparison += '  REGRESSION'
+                regressions.append(key)
+        print(f"{key:<{width}}{seconds:>12.6f}{peak / 2 ** 20:>10.1f}  {comparison}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,133 @@
 # fscraper/__init__.py
+#
+# The submodules(and pandas, numpy, requests, BeautifulSoup, etc.) are imported lazily
+# on the first access of a public name, e.g. `fs.calculate_rsi` only imports `fscraper.utils`.
 
-from .yfscraper import YahooFinanceScraper
-from .kabuyohoscraper import KabuyohoScraper
-from .kabutanscraper import KabutanScraper
-from .minkabuscraper import MinkabuScraper
-
-from .utils import (
-    calculate_pearson_correlation,
-    calculate_beta,
-    calculate_rsi,
-    calculate_stochastic_oscillator,
-    calculate_bollinger_bands,
-    calculate_macd,
-    get_x_days_high_low
-)
+import importlib
+from typing import TYPE_CHECKING
+
+# public name -> submodule
+_EXPORTS = {
+    'YahooFinanceScraper': 'yfscraper',
+    'KabuyohoScraper': 'kabuyohoscraper',
+    'KabutanScraper': 'kabutanscraper',
+    'MinkabuScraper': 'minkabuscraper',
+    'PriceCache': 'pricecache',
+    'PriceStore': 'store',
+    'ResponseCache': 'httpcache',
+    'AdaptiveConcurrency': 'flowcontrol',
+    'CircuitBreaker': 'flowcontrol',
+    'PollingScheduler': 'scheduler',
+    'MarketCalendar': 'scheduler',
+
+    'Transport': 'transport',
+    'get_default_transport': 'transport',
+    'set_default_transport': 'transport',
+
+    'CallEvent': 'instrumentation',
+    'Stats': 'instrumentation',
+    'Instrumentation': 'instrumentation',
+    'get_instrumentation': 'instrumentation',
+
+    'align': 'alignment',
+    'asof_join': 'alignment',
+    'resample_ohlcv': 'alignment',
+    'Resampler': 'alignment',
+
+    'calculate_pearson_correlation': 'utils',
+    'calculate_correlation_matrix': 'utils',
+    'get_top_correlated': 'utils',
+    'calculate_beta': 'utils',
+    'calculate_rolling_beta': 'utils',
+    'calculate_rsi': 'utils',
+    'calculate_stochastic_oscillator': 'utils',
+    'calculate_bollinger_bands': 'utils',
+    'calculate_macd': 'utils',
+    'get_x_days_high_low': 'utils',
+    'calculate_obv': 'utils',
+
+    'StreamingRSI': 'streaming',
+    'StreamingStochasticOscillator': 'streaming',
+    'StreamingBollingerBands': 'streaming',
+    'StreamingMACD': 'streaming',
+    'StreamingOBV': 'streaming',
+    'StreamingHighLow': 'streaming',
+}
+
+_SUBMODULES = {
+    'alignment', 'constant_table', 'exceptions', 'flowcontrol', 'httpcache', 'instrumentation', 'kabutanscraper',
+    'kabuyohoscraper', 'minkabuscraper', 'output', 'pricecache', 'ratelimit', 'scheduler', 'store', 'streaming',
+    'transport', 'utils', 'yfscraper',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # Cache the attribute, the later accesses don't go through `__getattr__`
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
+
+
+if TYPE_CHECKING:
+    from .yfscraper import YahooFinanceScraper
+    from .kabuyohoscraper import KabuyohoScraper
+    from .kabutanscraper import KabutanScraper
+    from .minkabuscraper import MinkabuScraper
+    from .pricecache import PriceCache
+    from .store import PriceStore
+    from .httpcache import ResponseCache
+    from .flowcontrol import AdaptiveConcurrency, CircuitBreaker
+    from .scheduler import PollingScheduler, MarketCalendar
+    from .transport import (
+        Transport,
+        get_default_transport,
+        set_default_transport
+    )
+    from .instrumentation import (
+        CallEvent,
+        Stats,
+        Instrumentation,
+        get_instrumentation
+    )
+
+    from .alignment import (
+        align,
+        asof_join,
+        resample_ohlcv,
+        Resampler
+    )
+
+    from .utils import (
+        calculate_pearson_correlation,
+        calculate_correlation_matrix,
+        get_top_correlated,
+        calculate_beta,
+        calculate_rolling_beta,
+        calculate_rsi,
+        calculate_stochastic_oscillator,
+        calculate_bollinger_bands,
+        calculate_macd,
+        get_x_days_high_low,
+        calculate_obv
+    )
+
+    from .streaming import (
+        StreamingRSI,
+        StreamingStochasticOscillator,
+        StreamingBollingerBands,
+        StreamingMACD,
+        StreamingOBV,
+        StreamingHighLow
+    )
@@ -0,0 +1,324 @@
+# fscraper/_kernels.py
+
+"""*Kernels of the indicators in `fscraper.utils`, for long series and large windows.*
+
+The kernels take 2-D float64 arrays(time x tickers) and compute each column in a single pass, without
+the intermediate Series of the pandas path. They repeat the arithmetic of the pandas window functions
+step by step(Kahan summation of `rolling().mean()`, the weights of `ewm(adjust=False).mean()`),
+so that the results are identical.
+
+The kernels are compiled by Numba if installed(`pip install fscraper[numba]`). Without Numba,
+`rolling_max`/`rolling_min` use a NumPy implementation and the others are not available(`NUMBA` is False).
+"""
+
+import math
+import numpy as np
+
+# Use numba for compiling the kernels if installed
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA = numba is not None
+
+
+def _jit(func):
+    if numba is None:
+        return func
+    # `error_model='numpy'`: division by zero gives inf/NaN like NumPy instead of raising
+    return numba.njit(cache=True, nogil=True, error_model='numpy')(func)
+
+
+def _prep(values: np.ndarray, window: int = None, inf_as_nan: bool = True) -> np.ndarray:
+    """Same input as the pandas window functions: 2-D float64 with inf replaced by NaN."""
+    if window is not None and window < 1:
+        raise ValueError(f"window must be 1 or greater, but {window} received.")
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        values = values[:, None]
+    if not inf_as_nan:
+        return values
+    inf = np.isinf(values)
+    return np.where(inf, np.nan, values) if inf.any() else values
+
+
+@_jit
+def _rolling_extremum(values, window, is_max):
+    """Rolling max/min by a monotonic queue of the candidate indices, O(n) for any window."""
+    n, m = values.shape
+    out = np.empty((n, m))
+    queue = np.empty(window, dtype=np.int64)    # ring buffer
+
+    for j in range(m):
+        column = values[:, j]
+        head = 0        # position of the front candidate
+        tail = -1       # position of the back candidate
+        size = 0
+        last_nan = -1   # also makes the first `window - 1` rows NaN
+        for i in range(n):
+            # Drop the candidate leaving the window
+            if size > 0 and queue[head] <= i - window:
+                head = head + 1 if head + 1 < window else 0
+                size -= 1
+
+            x = column[i]
+            if x != x:
+                last_nan = i
+            else:
+                # Drop the candidates which can't be the extremum anymore
+                while size > 0 and ((x >= column[queue[tail]]) if is_max else (x <= column[queue[tail]])):
+                    tail = tail - 1 if tail > 0 else window - 1
+                    size -= 1
+                tail = tail + 1 if tail + 1 < window else 0
+                queue[tail] = i
+                size += 1
+
+            out[i, j] = column[queue[head]] if i - last_nan >= window else np.nan
+
+    return out
+
+
+def _rolling_extremum_numpy(values, window, is_max):
+    """Rolling max/min by the prefix/suffix extrema of `window` sized blocks(van Herk/Gil-Werman)."""
+    n = len(values)
+    out = np.full(values.shape, np.nan)
+    if n < window:
+        return out
+
+    accumulate = np.maximum.accumulate if is_max else np.minimum.accumulate
+    pad = (-n) % window
+    blocks = np.concatenate([values, np.full((pad, values.shape[1]), np.nan)]).reshape(-1, window, values.shape[1])
+    prefix = accumulate(blocks, axis=1).reshape(-1, values.shape[1])
+    suffix = accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1, values.shape[1])
+
+    # The window ending at `i` is the suffix of its first block and the prefix of its last block,
+    # NaN propagates like the pandas path(NaN in the window is less than `window` observations)
+    extremum = np.maximum if is_max else np.minimum
+    out[window - 1:] = extremum(suffix[:n - window + 1], prefix[window - 1:n])
+
+    return out
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """Same as `rolling(window).max()`."""
+    values = _prep(values, window)
+    if NUMBA:
+        return _rolling_extremum(values, window, True)
+    return _rolling_extremum_numpy(values, window, True)
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """Same as `rolling(window).min()`."""
+    values = _prep(values, window)
+    if NUMBA:
+        return _rolling_extremum(values, window, False)
+    return _rolling_extremum_numpy(values, window, False)
+
+
+@_jit
+def _add_mean(x, nobs, sum_x, neg_ct, compensation, same_count, prev):
+    if x == x:
+        nobs += 1
+        y = x - compensation
+        t = sum_x + y
+        compensation = t - sum_x - y
+        sum_x = t
+        if math.copysign(1., x) < 0:
+            neg_ct += 1
+        # Count of the consecutive same values, the mean of a constant window is the value itself
+        same_count = same_count + 1 if x == prev else 1
+        prev = x
+    return nobs, sum_x, neg_ct, compensation, same_count, prev
+
+
+@_jit
+def _remove_mean(x, nobs, sum_x, neg_ct, compensation):
+    if x == x:
+        nobs -= 1
+        y = -x - compensation
+        t = sum_x + y
+        compensation = t - sum_x - y
+        sum_x = t
+        if math.copysign(1., x) < 0:
+            neg_ct -= 1
+    return nobs, sum_x, neg_ct, compensation
+
+
+@_jit
+def _calc_mean(min_periods, nobs, neg_ct, sum_x, same_count, prev):
+    if nobs < min_periods or nobs == 0:
+        return np.nan
+    if same_count >= nobs:
+        return prev
+    result = sum_x / nobs
+    if neg_ct == 0 and result < 0:
+        return 0.
+    if neg_ct == nobs and result > 0:
+        return 0.
+    return result
+
+
+@_jit
+def _move(values, i, j, is_up):
+    """Up/down move of the price at row `i`, same as `diff(1).clip(lower=0)` / `abs(diff(1).clip(upper=0))`."""
+    if i == 0:
+        return np.nan
+    delta = values[i, j] - values[i - 1, j]
+    if delta != delta:
+        return np.nan
+    if is_up:
+        move = delta if delta > 0 else 0.
+    else:
+        move = -delta if delta < 0 else 0.
+    # inf is NaN for the window functions, only on the side of the move
+    return np.nan if math.isinf(move) else move
+
+
+@_jit
+def _ewm_update(x, weighted, old_wt, nobs, com):
+    """One step of `ewm(com=com, adjust=False).mean()`."""
+    alpha = 1. / (1. + com)
+    is_observation = x == x
+    nobs += is_observation
+    if weighted == weighted:
+        old_wt *= 1. - alpha
+        if is_observation:
+            # Avoid numerical errors on constant series
+            if weighted != x:
+                new_wt = 1. - old_wt if com == 1 else alpha
+                weighted = old_wt * weighted + new_wt * x
+                weighted /= old_wt + new_wt
+            old_wt = 1.
+    elif is_observation:
+        weighted = x
+    return weighted, old_wt, nobs
+
+
+@_jit
+def _rolling_mean(values, window):
+    n, m = values.shape
+    out = np.empty((n, m))
+
+    for j in range(m):
+        nobs, neg_ct, same_count = 0, 0, 0
+        sum_x, compensation_add, compensation_remove, prev = 0., 0., 0., 0.
+        for i in range(n):
+            start = max(i - window + 1, 0)
+            if i == 0 or start >= i:
+                nobs, neg_ct, same_count = 0, 0, 0
+                sum_x, compensation_add, compensation_remove, prev = 0., 0., 0., values[start, j]
+                for k in range(start, i + 1):
+                    nobs, sum_x, neg_ct, compensation_add, same_count, prev = _add_mean(
+                        values[k, j], nobs, sum_x, neg_ct, compensation_add, same_count, prev)
+            else:
+                for k in range(max(i - window, 0), start):
+                    nobs, sum_x, neg_ct, compensation_remove = _remove_mean(
+                        values[k, j], nobs, sum_x, neg_ct, compensation_remove)
+                nobs, sum_x, neg_ct, compensation_add, same_count, prev = _add_mean(
+                    values[i, j], nobs, sum_x, neg_ct, compensation_add, same_count, prev)
+
+            out[i, j] = _calc_mean(window, nobs, neg_ct, sum_x, same_count, prev)
+
+    return out
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Same as `rolling(window).mean()`, requires Numba."""
+    return _rolling_mean(_prep(values, window), window)
+
+
+@_jit
+def _rsi(values, periods, wilder, com):
+    n, m = values.shape
+    out = np.empty((n, m))
+
+    for j in range(m):
+        # Simple moving average of the up/down moves, one state per side
+        up_nobs, up_neg, up_same, down_nobs, down_neg, down_same = 0, 0, 0, 0, 0, 0
+        up_sum, up_add, up_remove, up_prev = 0., 0., 0., 0.
+        down_sum, down_add, down_remove, down_prev = 0., 0., 0., 0.
+        # Wilder's smoothing, one state per side
+        up_weighted, up_wt, down_weighted, down_wt = np.nan, 1., np.nan, 1.
+
+        for i in range(n):
+            if wilder:
+                up_weighted, up_wt, up_nobs = _ewm_update(_move(values, i, j, True), up_weighted, up_wt, up_nobs, com)
+                down_weighted, down_wt, down_nobs = _ewm_update(
+                    _move(values, i, j, False), down_weighted, down_wt, down_nobs, com)
+                average_up = up_weighted if up_nobs >= periods else np.nan
+                average_down = down_weighted if down_nobs >= periods else np.nan
+            else:
+                start = max(i - periods + 1, 0)
+                if i == 0 or start >= i:
+                    up_nobs, up_neg, up_same, down_nobs, down_neg, down_same = 0, 0, 0, 0, 0, 0
+                    up_sum, up_add, up_remove, up_prev = 0., 0., 0., _move(values, start, j, True)
+                    down_sum, down_add, down_remove, down_prev = 0., 0., 0., _move(values, start, j, False)
+                    for k in range(start, i + 1):
+                        up_nobs, up_sum, up_neg, up_add, up_same, up_prev = _add_mean(
+                            _move(values, k, j, True), up_nobs, up_sum, up_neg, up_add, up_same, up_prev)
+                        down_nobs, down_sum, down_neg, down_add, down_same, down_prev = _add_mean(
+                            _move(values, k, j, False), down_nobs, down_sum, down_neg, down_add, down_same, down_prev)
+                else:
+                    for k in range(max(i - periods, 0), start):
+                        up_nobs, up_sum, up_neg, up_remove = _remove_mean(
+                            _move(values, k, j, True), up_nobs, up_sum, up_neg, up_remove)
+                        down_nobs, down_sum, down_neg, down_remove = _remove_mean(
+                            _move(values, k, j, False), down_nobs, down_sum, down_neg, down_remove)
+                    up_nobs, up_sum, up_neg, up_add, up_same, up_prev = _add_mean(
+                        _move(values, i, j, True), up_nobs, up_sum, up_neg, up_add, up_same, up_prev)
+                    down_nobs, down_sum, down_neg, down_add, down_same, down_prev = _add_mean(
+                        _move(values, i, j, False), down_nobs, down_sum, down_neg, down_add, down_same, down_prev)
+                average_up = _calc_mean(periods, up_nobs, up_neg, up_sum, up_same, up_prev)
+                average_down = _calc_mean(periods, down_nobs, down_neg, down_sum, down_same, down_prev)
+
+            rs = average_up / average_down
+            out[i, j] = 100 - (100 / (1 + rs))
+
+    return out
+
+
+def rsi(values: np.ndarray, periods: int, wilder: bool = False) -> np.ndarray:
+    """Same as `calculate_rsi(engine='pandas')`, requires Numba."""
+    # The moves are computed from the prices as is, inf is NaN only for the averages
+    values = _prep(values, periods, inf_as_nan=False)
+    alpha = 1 / periods
+    return _rsi(values, periods, wilder, float((1 - alpha) / alpha))
+
+
+@_jit
+def _macd(values, short_com, long_com, signal_com, short_periods, long_periods, signal_periods):
+    n, m = values.shape
+    macd = np.empty((n, m))
+    signal = np.empty((n, m))
+    histogram = np.empty((n, m))
+
+    for j in range(m):
+        short_weighted, short_wt, short_nobs = np.nan, 1., 0
+        long_weighted, long_wt, long_nobs = np.nan, 1., 0
+        signal_weighted, signal_wt, signal_nobs = np.nan, 1., 0
+        for i in range(n):
+            x = values[i, j]
+            short_weighted, short_wt, short_nobs = _ewm_update(x, short_weighted, short_wt, short_nobs, short_com)
+            long_weighted, long_wt, long_nobs = _ewm_update(x, long_weighted, long_wt, long_nobs, long_com)
+            short_ema = short_weighted if short_nobs >= short_periods else np.nan
+            long_ema = long_weighted if long_nobs >= long_periods else np.nan
+            macd[i, j] = short_ema - long_ema
+
+            # The signal line is the EMA of the MACD line, inf is NaN for ewm
+            x = np.nan if math.isinf(macd[i, j]) else macd[i, j]
+            signal_weighted, signal_wt, signal_nobs = _ewm_update(
+                x, signal_weighted, signal_wt, signal_nobs, signal_com)
+            signal[i, j] = signal_weighted if signal_nobs >= signal_periods else np.nan
+            histogram[i, j] = macd[i, j] - signal[i, j]
+
+    return macd, signal, histogram
+
+
+def macd(values: np.ndarray, short_periods: int, long_periods: int, signal_periods: int) -> tuple:
+    """Same as `calculate_macd(engine='pandas')`, requires Numba."""
+    values = _prep(values)
+    # Center of mass of the spans, computed like pandas
+    coms = [float((span - 1) / 2) for span in [short_periods, long_periods, signal_periods]]
+    minimums = [max(int(span), 1) for span in [short_periods, long_periods, signal_periods]]
+    return _macd(values, *coms, *minimums)
@@ -0,0 +1,191 @@
+# fscraper/alignment.py
+
+"""*Align the outputs of the scrapers on a common time axis, and resample the bars.*
+
+The scrapers index their results differently: `YahooFinanceScraper` by local time strings(or a tz-aware
+`DatetimeIndex` with `datetime_index=True`), `KabutanScraper` by a tz-aware `DatetimeIndex` and
+`MinkabuScraper` by a naive `DatetimeIndex`. `align` converts any of them to a sorted tz-aware
+`DatetimeIndex`(nanoseconds), whose int64 values(`time_axis`) are used for the joins and the resampling.
+
+Example:
+    >>> minutes = KabutanScraper('7203.T').get_stock_price_by_minutes()
+    >>> analysis = MinkabuScraper('7203.T').get_analysis()
+    >>> df = asof_join(minutes, analysis[['target_price']])
+    >>> bars = Resampler(minutes)
+    >>> bars.resample('5m')
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+# Aggregation of the OHLCV columns, the other columns take the last value of the bucket
+OHLCV_AGGREGATIONS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+
+def _duration(rule) -> int:
+    """Nanoseconds of a duration given as a scraper interval('5m', '1h', '1d') or a `pd.Timedelta`."""
+    if isinstance(rule, str):
+        match = re.fullmatch(r'(\d+)(m|h|d)', rule)
+        if match is not None:
+            rule = match.group(1) + {'m': 'min', 'h': 'h', 'd': 'D'}[match.group(2)]
+    duration = pd.Timedelta(rule).value
+    if duration <= 0:
+        raise ValueError(f"Invalid duration {rule}.")
+    return duration
+
+
+def align(df: pd.DataFrame, tz: str = 'Asia/Tokyo') -> pd.DataFrame:
+    """Index the data by a sorted tz-aware `DatetimeIndex` in nanoseconds.
+
+    Args:
+        df (pd.DataFrame | pd.Series): Output of a scraper, indexed by date strings, a naive
+            `DatetimeIndex`(local time in `tz`) or a tz-aware `DatetimeIndex`.
+        tz (str): Timezone of the local times, and of the result.
+
+    Returns:
+        pd.DataFrame | pd.Series: The data with the aligned index, not copied if already aligned.
+    """
+    index = df.index
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(pd.to_datetime(index))
+    if index.tz is None:
+        index = index.tz_localize(tz)
+    elif str(index.tz) != tz:
+        index = index.tz_convert(tz)
+    if index.dtype != f'datetime64[ns, {tz}]':
+        index = index.as_unit('ns')
+
+    if index is not df.index:
+        df = df.set_axis(index.rename(df.index.name))
+    if not index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    return df
+
+
+def time_axis(df: pd.DataFrame) -> np.ndarray:
+    """Get the time axis of the aligned data, int64 nanoseconds since epoch(UTC)."""
+    return df.index.asi8
+
+
+def asof_join(left: pd.DataFrame, right: pd.DataFrame, tolerance=None, tz: str = 'Asia/Tokyo') -> pd.DataFrame:
+    """Join each row of `left` with the last row of `right` at or before its time.
+
+    Args:
+        left (pd.DataFrame): Data whose index is kept, e.g. minute bars.
+        right (pd.DataFrame | pd.Series): Data to join, e.g. daily analysis data.
+        tolerance (str | pd.Timedelta): Maximum distance to the joined row, None for no limit.
+        tz (str): Timezone of the naive or string indexes, and of the result.
+
+    Returns:
+        pd.DataFrame: `left` aligned, with the columns of `right`(NaN where no row matches).
+
+    Example:
+        >>> asof_join(minutes, analysis[['target_price', 'theoretical_price']], tolerance='3d')
+    """
+    left = align(left, tz)
+    right = align(right, tz)
+    if isinstance(right, pd.Series):
+        right = right.to_frame()
+
+    left_axis = time_axis(left)
+    right_axis = time_axis(right)
+    positions = np.searchsorted(right_axis, left_axis, side='right') - 1
+    matched = positions >= 0
+    if tolerance is not None:
+        matched &= left_axis - right_axis[np.maximum(positions, 0)] <= _duration(tolerance)
+
+    joined = right.iloc[np.maximum(positions, 0)].set_axis(left.index)
+    if not matched.all():
+        joined = joined.where(pd.Series(matched, index=left.index), axis=0)
+
+    return pd.concat([left, joined], axis=1)
+
+
+def resample_ohlcv(bars: pd.DataFrame, rule: str, tz: str = 'Asia/Tokyo') -> pd.DataFrame:
+    """Resample the bars to a coarser resolution.
+
+    The buckets are aligned to the local time in `tz`(e.g. the daily bars are the local days),
+    labeled by their start, and the empty buckets are dropped.
+
+    Args:
+        bars (pd.DataFrame): Bars with any of the `open`, `high`, `low`, `close` and `volume` columns.
+        rule (str): Resolution, e.g. '5m', '15m', '1h' or '1d'.
+        tz (str): Timezone of the naive or string indexes, and of the result.
+
+    Returns:
+        pd.DataFrame: The resampled bars, `open`/`close` are the first/last bars of the bucket,
+            `high`/`low` the max/min and `volume` the sum(NaNs skipped). The other columns take the last value.
+    """
+    bars = align(bars, tz)
+    width = _duration(rule)
+
+    local = bars.index.tz_localize(None).asi8
+    buckets = local // width * width
+    if len(buckets) == 0:
+        return bars.iloc[:0]
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    columns = dict()
+    for name in bars.columns:
+        values = bars[name].to_numpy()
+        aggregation = OHLCV_AGGREGATIONS.get(name, 'last')
+        if aggregation == 'first':
+            columns[name] = values[starts]
+        elif aggregation == 'last':
+            columns[name] = values[ends]
+        elif aggregation == 'max':
+            columns[name] = np.fmax.reduceat(values, starts)
+        elif aggregation == 'min':
+            columns[name] = np.fmin.reduceat(values, starts)
+        elif np.issubdtype(values.dtype, np.integer):
+            columns[name] = np.add.reduceat(values, starts)
+        else:
+            columns[name] = np.add.reduceat(np.nan_to_num(values, nan=0), starts)
+
+    index = pd.DatetimeIndex(buckets[starts].view('datetime64[ns]'), name=bars.index.name).tz_localize(tz)
+    return pd.DataFrame(columns, index=index)
+
+
+class Resampler(object):
+    """Resample the bars to several resolutions, caching the results.
+
+    Asking again for the same resolution returns the cached frame. Coarser resolutions are computed
+    from the finest cached one which divides them(e.g. '1h' from '15m'), and the cache is cleared
+    when new bars are appended.
+
+    Attributes:
+        bars(pd.DataFrame): the aligned source bars
+        tz(str): timezone of the buckets
+
+    Example:
+        >>> bars = Resampler(KabutanScraper('7203.T').get_stock_price_by_minutes())
+        >>> five = bars.resample('5m')
+        >>> hourly = bars.resample('1h')   # from the 5 minutes bars
+    """
+
+    def __init__(self, bars: pd.DataFrame, tz: str = 'Asia/Tokyo'):
+        self.tz = tz
+        self.bars = align(bars, tz)
+        self._cache = dict()
+
+    def resample(self, rule: str) -> pd.DataFrame:
+        """Get the bars at the resolution, see `resample_ohlcv`."""
+        width = _duration(rule)
+        if width not in self._cache:
+            # The buckets of a divisor are nested in the requested ones
+            divisors = [w for w in self._cache if width % w == 0]
+            source = self._cache[max(divisors)] if len(divisors) > 0 else self.bars
+            self._cache[width] = resample_ohlcv(source, rule, self.tz)
+        return self._cache[width]
+
+    def append(self, bars: pd.DataFrame):
+        """Append the bars newer than the last one, e.g. from `poll_stock_price_by_minutes`."""
+        bars = align(bars, self.tz)
+        if len(self.bars) > 0:
+            bars = bars[bars.index > self.bars.index[-1]]
+        if len(bars) > 0:
+            self.bars = pd.concat([self.bars, bars])
+            self._cache.clear()
@@ -22,4 +22,21 @@ class InvalidFinancialReportType(Exception):
 class DelistedCode(Exception):
 
     def __init__(self, code):
-        self.message = f"Invalid data, the code {code} may have been delisted."
\ No newline at end of file
+        self.message = f"Invalid data, the code {code} may have been delisted."
+
+
+class TruncatedResponse(Exception):
+    """KabutanScraper: Raised when the response body was cut off, e.g. by an overloaded server"""
+
+    def __init__(self, url):
+        self.url = url
+        self.message = f"The response of {url} is truncated."
+
+
+class CircuitOpen(Exception):
+    """Transport: Raised without sending the request while the circuit breaker of the host is open"""
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        self.retry_after = retry_after
+        self.message = f"The circuit of {host} is open, retry after {retry_after:.1f} seconds."
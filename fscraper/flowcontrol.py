@@ -0,0 +1,195 @@
+import time
+import threading
+from .exceptions import CircuitOpen
+
+# Latencies below this(in seconds) are timer noise rather than a signal of the host's load
+MIN_BASELINE = 0.01
+
+
+class AdaptiveConcurrency(object):
+    """Per-host limit of the concurrent requests, adapted by AIMD(additive increase, multiplicative decrease).
+
+    While the requests of a host use up its limit and the responses are healthy, the limit grows by one per
+    round of requests. It is multiplied by `decrease` on an overload signal: a 429/5xx response, a connection
+    error or timeout, an invalid(e.g. truncated) body, or a latency above `slowdown` times the baseline
+    latency of the host. The requests in flight together account for one decrease only.
+
+    Attributes:
+        initial(int): starting limit of a host
+        minimum(int): lowest limit
+        maximum(int): highest limit
+        decrease(float): factor applied to the limit on an overload signal
+        slowdown(float): latency ratio to the baseline considered as an overload
+
+    Example:
+        >>> transport = Transport(concurrency=AdaptiveConcurrency(initial=4, maximum=32))
+        >>> transport.concurrency.limit('query2.finance.yahoo.com')
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64, decrease: float = 0.5,
+                 slowdown: float = 3):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.slowdown = slowdown
+        self._hosts = dict()
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostLimit(self.initial)
+            return state
+
+    def acquire(self, host: str) -> float:
+        """Wait until a request to the host is allowed.
+
+        Returns:
+            float: The send time(monotonic), to be given back to `release`.
+        """
+        state = self._host(host)
+        with state.condition:
+            while state.inflight >= int(state.limit):
+                state.condition.wait()
+            state.inflight += 1
+        return time.monotonic()
+
+    def release(self, host: str, sent: float, healthy: bool):
+        """Release the slot of a finished request, and adapt the limit of the host.
+
+        Args:
+            host (str): Host of the request.
+            sent (float): Send time returned by `acquire`.
+            healthy (bool): Whether the host answered normally, None if the outcome says nothing about the host.
+        """
+        state = self._host(host)
+        now = time.monotonic()
+        latency = now - sent
+        with state.condition:
+            saturated = state.inflight >= int(state.limit)
+            state.inflight -= 1
+
+            if healthy is not None:
+                slow = state.baseline is not None and latency > self.slowdown * max(state.baseline, MIN_BASELINE)
+                if healthy:
+                    # The baseline follows the faster responses at once and the slower ones gradually,
+                    # so that a lasting slowdown becomes the new normal
+                    if state.baseline is None or latency < state.baseline:
+                        state.baseline = latency
+                    else:
+                        state.baseline += 0.1 * (latency - state.baseline)
+
+                if (not healthy or slow) and sent > state.decreased:
+                    state.limit = max(self.minimum, state.limit * self.decrease)
+                    state.decreased = now
+                elif healthy and not slow and saturated:
+                    state.limit = min(self.maximum, state.limit + 1 / state.limit)
+
+            state.condition.notify_all()
+
+    def limit(self, host: str) -> int:
+        """Current limit of the concurrent requests to the host."""
+        return int(self._host(host).limit)
+
+
+class _HostLimit(object):
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.inflight = 0
+        self.baseline = None        # latency of the healthy responses in seconds
+        self.decreased = -float('inf')
+        self.condition = threading.Condition()
+
+
+class CircuitBreaker(object):
+    """Per-host circuit breaker, failing fast while a host is unhealthy.
+
+    After `failure_threshold` consecutive overload signals(429/5xx responses, connection errors, timeouts or
+    invalid bodies) the circuit of the host opens: the requests raise `CircuitOpen` without being sent. After
+    `reset_timeout` seconds one trial request is let through(half-open), closing the circuit if it succeeds
+    and opening it again otherwise.
+
+    Attributes:
+        failure_threshold(int): consecutive failures opening the circuit
+        reset_timeout(float): seconds before a trial request is let through an open circuit
+
+    Example:
+        >>> transport = Transport(breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+        >>> transport.breaker.state('kabutan.jp')
+        'closed'
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._hosts = dict()
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostCircuit()
+        return state
+
+    def allow(self, host: str):
+        """Check that a request to the host can be sent.
+
+        Raises:
+            CircuitOpen: If the circuit of the host is open, or half-open with the trial request in flight.
+        """
+        with self._lock:
+            state = self._host(host)
+            if state.opened is None:
+                return
+
+            elapsed = time.monotonic() - state.opened
+            if elapsed >= self.reset_timeout and not state.trial:
+                state.trial = True
+                return
+            raise CircuitOpen(host, max(self.reset_timeout - elapsed, 0))
+
+    def record(self, host: str, healthy: bool):
+        """Record the outcome of a request to the host.
+
+        Args:
+            host (str): Host of the request.
+            healthy (bool): Whether the host answered normally, None if the outcome says nothing about the host.
+        """
+        with self._lock:
+            state = self._host(host)
+            trial, state.trial = state.trial, False
+            if healthy is None:
+                return
+
+            if healthy:
+                state.failures = 0
+                state.opened = None
+            else:
+                state.failures += 1
+                if trial or state.failures >= self.failure_threshold:
+                    state.opened = time.monotonic()
+
+    def state(self, host: str) -> str:
+        """State of the circuit of the host, 'closed', 'open' or 'half-open'."""
+        with self._lock:
+            state = self._host(host)
+            if state.opened is None:
+                return self.CLOSED
+            if time.monotonic() - state.opened >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+
+class _HostCircuit(object):
+
+    def __init__(self):
+        self.failures = 0
+        self.opened = None      # monotonic time, None while closed
+        self.trial = False      # whether the trial request of the half-open circuit is in flight
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import requests
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.structures import CaseInsensitiveDict
+
+# Headers which don't apply to the stored(decoded) body
+_SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+
+def _is_cache_buster(name, value):
+    """Millisecond timestamps appended by the scrapers, e.g. `_=1700000000000` or `&1700000000000=`."""
+    return name == '_' or (name.isdigit() and value == '')
+
+
+class ResponseCache(object):
+    """On-disk HTTP response cache with TTL, conditional revalidation and size-bounded LRU eviction.
+
+    A response younger than `ttl` is served without any request, an older one is revalidated
+    with `If-None-Match`/`If-Modified-Since` and served again on `304 Not Modified`.
+
+    Attributes:
+        directory(str): directory holding the cached responses
+        ttl(float): seconds during which a response is served without revalidation
+        max_bytes(int): maximum total size of the cached bodies
+
+    Example:
+        >>> transport = Transport(cache=ResponseCache('~/.fscraper/http', ttl=60))
+    """
+
+    def __init__(self, directory: str, ttl: float = 60, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # key -> body size, ordered from the least recently used, and their running total
+        self._sizes = OrderedDict()
+        self._total = 0
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.body'):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-len('.body')], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        """Get the cache key of the request, ignoring the order of the query and the cache-busting timestamps.
+
+        Args:
+            url (str): URL of the request.
+            params (dict): Query parameters.
+
+        Returns:
+            str: The cache key.
+        """
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        parts = urlsplit(full_url)
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_cache_buster(k, v)]
+        normalized = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ''))
+
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key: str):
+        """Get the cached entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: The stored metadata with the body under 'body', or None if not cached.
+        """
+        try:
+            with open(self._path(key, '.json'), 'r') as f:
+                entry = json.load(f)
+            with open(self._path(key, '.body'), 'rb') as f:
+                entry['body'] = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # The modification time keeps the LRU order across processes
+        try:
+            os.utime(self._path(key, '.body'))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Whether the entry can be served without revalidation."""
+        return time.time() - entry['stored_at'] < self.ttl
+
+    def put(self, key: str, response: requests.Response):
+        """Store the response, evicting the least recently used ones over `max_bytes`.
+
+        Args:
+            key (str): The cache key.
+            response (requests.Response): A successful response.
+        """
+        body = response.content
+        if len(body) > self.max_bytes:
+            return
+
+        entry = {
+            'url': response.url,
+            'status': response.status_code,
+            'encoding': response.encoding,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in _SKIPPED_HEADERS},
+            'stored_at': time.time(),
+        }
+        self._write(self._path(key, '.body'), body)
+        self._write(self._path(key, '.json'), json.dumps(entry).encode())
+
+        with self._lock:
+            self._total += len(body) - self._sizes.get(key, 0)
+            self._sizes[key] = len(body)
+            self._sizes.move_to_end(key)
+            evicted = []
+            while self._total > self.max_bytes:
+                old_key, size = self._sizes.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove(old_key)
+
+    def refresh(self, key: str, entry: dict):
+        """Mark the entry as revalidated(`304 Not Modified`)."""
+        entry = {k: v for k, v in entry.items() if k != 'body'}
+        entry['stored_at'] = time.time()
+        self._write(self._path(key, '.json'), json.dumps(entry).encode())
+
+    def clear(self):
+        """Remove all the cached responses."""
+        with self._lock:
+            keys = list(self._sizes)
+            self._sizes.clear()
+            self._total = 0
+        for key in keys:
+            self._remove(key)
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _remove(self, key):
+        for suffix in ('.json', '.body'):
+            try:
+                os.remove(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def to_response(entry: dict) -> requests.Response:
+        """Build a `requests.Response` from the cached entry, flagged by `from_cache`."""
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.url = entry['url']
+        response.encoding = entry['encoding']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['body']
+        response.from_cache = True
+
+        return response
@@ -0,0 +1,249 @@
+"""*Instrumentation of the scraper calls.*
+
+Every public scraper method emits one `CallEvent` when it returns, measuring the requests sent through
+the `Transport`(network time, bytes, status, retries and cache hits) and the time spent parsing the
+payload(JSON/HTML/CSV) and building the DataFrame. The events are passed to the subscribed callbacks
+and aggregated by the `Stats` of the instrumentation.
+
+Example:
+    >>> instrumentation = get_instrumentation()
+    >>> instrumentation.subscribe(lambda event: print(event))
+    >>> fs.YahooFinanceScraper('7203.T').get_financials('balancesheet', 'annual')
+    >>> instrumentation.stats.summary()['YahooFinanceScraper.get_financials']['network_time']['p50']
+"""
+
+import time
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+_current_event = contextvars.ContextVar('fscraper_call_event', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class CallEvent(object):
+    """Measurements of one scraper call.
+
+    Attributes:
+        scraper(str): class name of the scraper
+        method(str): name of the called method
+        host(str): host of the last request
+        endpoint(str): path of the last request
+        status(int): status code of the last request
+        requests(int): number of requests sent(or served from the cache)
+        bytes(int): total size of the response bodies
+        network_time(float): seconds spent in the requests, including the retries
+        parse_time(float): seconds spent decoding the JSON/HTML/CSV payload
+        dataframe_time(float): seconds spent building the DataFrame
+        total_time(float): seconds spent in the call
+        retries(int): number of retried requests
+        cache_hits(int): number of responses served from the cache
+        error(str): the raised exception, None on success
+    """
+
+    def __init__(self, scraper: str, method: str):
+        self.scraper = scraper
+        self.method = method
+        self.host = None
+        self.endpoint = None
+        self.status = None
+        self.requests = 0
+        self.bytes = 0
+        self.network_time = 0.0
+        self.parse_time = 0.0
+        self.dataframe_time = 0.0
+        self.total_time = 0.0
+        self.retries = 0
+        self.cache_hits = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.scraper}.{self.method}"
+
+    def add_request(self, url, status, nbytes, elapsed, retries, cache_hit):
+        parts = urlsplit(url)
+        with self._lock:
+            self.host = parts.netloc
+            self.endpoint = parts.path
+            self.status = status
+            self.requests += 1
+            self.bytes += nbytes
+            self.network_time += elapsed
+            self.retries += retries
+            self.cache_hits += int(cache_hit)
+
+    def add_phase(self, phase, elapsed):
+        with self._lock:
+            setattr(self, phase + '_time', getattr(self, phase + '_time') + elapsed)
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
+    def __repr__(self):
+        return (f"CallEvent({self.name}, host={self.host}, status={self.status}, bytes={self.bytes}, "
+                f"network={self.network_time:.4f}s, parse={self.parse_time:.4f}s, "
+                f"dataframe={self.dataframe_time:.4f}s, retries={self.retries}, cache_hits={self.cache_hits})")
+
+
+class Stats(object):
+    """In-process aggregate of the call events, keeping the latest `max_samples` of each method.
+
+    Attributes:
+        max_samples(int): number of the latest events kept for the percentiles of each method
+    """
+
+    TIMINGS = ('total_time', 'network_time', 'parse_time', 'dataframe_time')
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._samples = dict()
+        self._counters = dict()
+        self._lock = threading.Lock()
+
+    def record(self, event: CallEvent):
+        with self._lock:
+            if event.name not in self._samples:
+                self._samples[event.name] = {t: deque(maxlen=self.max_samples) for t in self.TIMINGS}
+                self._counters[event.name] = dict.fromkeys(
+                    ('calls', 'errors', 'requests', 'bytes', 'retries', 'cache_hits'), 0)
+            for timing in self.TIMINGS:
+                self._samples[event.name][timing].append(getattr(event, timing))
+
+            counters = self._counters[event.name]
+            counters['calls'] += 1
+            counters['errors'] += int(event.error is not None)
+            for key in ('requests', 'bytes', 'retries', 'cache_hits'):
+                counters[key] += getattr(event, key)
+
+    def percentile(self, name: str, timing: str, q: float) -> float:
+        """Get the percentile of a timing.
+
+        Args:
+            name (str): `Scraper.method`, e.g. 'YahooFinanceScraper.get_financials'.
+            timing (str): 'total_time', 'network_time', 'parse_time' or 'dataframe_time'.
+            q (float): Percentile between 0 and 100.
+
+        Returns:
+            float: The percentile(linear interpolation) in seconds.
+        """
+        with self._lock:
+            values = sorted(self._samples[name][timing])
+        position = (len(values) - 1) * q / 100
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def summary(self, percentiles=(50, 90, 99)) -> dict:
+        """Get the counters and the timing percentiles of each method.
+
+        Returns:
+            dict: `{name: {'calls': int, ..., 'network_time': {'p50': float, ...}, ...}}`
+        """
+        with self._lock:
+            names = list(self._samples)
+        summary = dict()
+        for name in names:
+            summary[name] = dict(self._counters[name])
+            for timing in self.TIMINGS:
+                summary[name][timing] = {f"p{q}": self.percentile(name, timing, q) for q in percentiles}
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counters.clear()
+
+
+class Instrumentation(object):
+    """Dispatcher of the call events to the callbacks and the `Stats`.
+
+    Attributes:
+        enabled(bool): measure the calls, set to False for removing the overhead
+        stats(Stats): aggregate of all the events
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.stats = Stats()
+        self._callbacks = []
+
+    def subscribe(self, callback):
+        """Call `callback(event)` on every finished scraper call."""
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def emit(self, event: CallEvent):
+        """Record the event and pass it to the callbacks, a failing callback is logged and doesn't affect the call."""
+        self.stats.record(event)
+        for callback in list(self._callbacks):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Instrumentation callback %r failed on %s", callback, event.name)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Get the instrumentation shared by all the scrapers."""
+    return _instrumentation
+
+
+def instrumented(method):
+    """Decorator of the scraper methods emitting a `CallEvent` per call.
+
+    Calls made within an instrumented call(e.g. helpers) are accounted to the outer call.
+    Apply it under `@classmethod` for the batch methods.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _instrumentation.enabled or _current_event.get() is not None:
+            return method(self, *args, **kwargs)
+
+        scraper = self.__name__ if isinstance(self, type) else type(self).__name__
+        event = CallEvent(scraper, method.__name__)
+        token = _current_event.set(event)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as e:
+            event.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event.total_time = time.perf_counter() - start
+            _current_event.reset(token)
+            _instrumentation.emit(event)
+
+    return wrapper
+
+
+@contextmanager
+def phase(name: str):
+    """Measure a phase('parse' or 'dataframe') of the current scraper call."""
+    event = _current_event.get()
+    if event is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        event.add_phase(name, time.perf_counter() - start)
+
+
+def record_request(url: str, status: int, nbytes: int, elapsed: float, retries: int = 0, cache_hit: bool = False):
+    """Account a request to the current scraper call, called by the `Transport`."""
+    event = _current_event.get()
+    if event is not None:
+        event.add_request(url, status, nbytes, elapsed, retries, cache_hit)
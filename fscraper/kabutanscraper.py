@@ -1,74 +1,144 @@
 import time
 import pytz
-import requests
 import pandas as pd
-from datetime import datetime
 from io import StringIO
-from .exceptions import DelistedCode
-
-headers = {
-        'User-Agent' : 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:104.0) Gecko/20100101 Firefox/104.0',
-        'Cache-Control': 'no-cache, max-age=0'
-    }
+from .exceptions import DelistedCode, TruncatedResponse
+from .transport import get_default_transport
+from .instrumentation import instrumented, phase
+from .output import check_output, frame_to_table
 
 class KabutanScraper(object):
     """Scraper for Kabutan(株探)
     """
 
-    def __init__(self, code: str):
+    # Number of the fields of a row of the minutes CSV
+    FIELDS = 12
+
+    def __init__(self, code: str, transport=None):
         self.code = code.upper().replace('.T', '')
+        self._transport = transport if transport is not None else get_default_transport()
+        self._last_bar = None
 
-    def get_stock_price_by_minutes(self) -> pd.DataFrame:
+    @instrumented
+    def get_stock_price_by_minutes(self, output='pandas') -> pd.DataFrame:
         """Get stock price data by minute.
 
+        Args:
+            output (str): 'pandas', 'arrow' for a `pyarrow.Table` or 'polars' for a `polars.DataFrame`, 
+                with a tz-aware `date` column. The numeric columns are handed over without copy.
+
         Returns:
             pd.DataFrame: A DataFrame containing stock prices indexed by minute.
 
         Raises:
             DelistedCode: If the stock code has been delisted.
+            TruncatedResponse: If the body is still cut off after the retries.
+            requests.HTTPError: If the server still fails after the retries, e.g. with a 429/5xx.
 
         Example:
             >>> from some_module import KabutanScraper
             >>> kt = KabutanScraper('7203.T')
             >>> df = kt.get_stock_price_by_minutes()
         """
-        url = "https://kabutan.jp/stock/read?c={}&m=4&k=1&{}=".format(self.code, int(time.time() * 1000))
-        response = requests.get(url=url, headers=headers)
-        html = response.text
+        check_output(output)
 
-        if len(html) < 10:
-            raise DelistedCode(code=self.code) 
-        
-        csvStringIO = StringIO(html)
-        df = pd.read_csv(csvStringIO, sep=",", header=None)
+        html = self.__request_minutes()
         
-        df = df.iloc[1:]    # Drop the first row, dummy data
+        return KabutanScraper.__parse_minutes(html, output=output)
+
+    @instrumented
+    def poll_stock_price_by_minutes(self) -> pd.DataFrame:
+        """Get the minute bars which are newer than the last bar returned by the previous poll.
+
+        The first call returns the whole session, the following calls only the new bars 
+        (an empty DataFrame if nothing new).
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the new stock prices indexed by minute.
 
-        def convert_to_datetime(date1, date2):
-            # Combine the two dates
-            combined_date = date2 + date1[-6:]
+        Raises:
+            DelistedCode: If the stock code has been delisted.
+            TruncatedResponse: If the body is still cut off after the retries.
+            requests.HTTPError: If the server still fails after the retries, e.g. with a 429/5xx.
 
-            # Convert to datetime object
-            datetime_obj = datetime.strptime(combined_date, "%Y.%m.%d/%H:%M")
+        Example:
+            >>> kt = KabutanScraper('7203.T')
+            >>> while True:
+            ...     new_bars = kt.poll_stock_price_by_minutes()
+            ...     time.sleep(60)
+        """
+        html = self.__request_minutes()
+        df = KabutanScraper.__parse_minutes(html, after=self._last_bar)
 
-            # Define the timezone for Asia/Tokyo
-            tokyo_tz = pytz.timezone('Asia/Tokyo')
+        if len(df) > 0:
+            self._last_bar = df.index[-1]
 
-            # Localize the naive datetime object to the Tokyo timezone
-            datetime_obj_with_tz = tokyo_tz.localize(datetime_obj)
+        return df
 
-            return datetime_obj_with_tz
+    def __request_minutes(self):
+        url = "https://kabutan.jp/stock/read?c={}&m=4&k=1&{}=".format(self.code, int(time.time() * 1000))
+        # A truncated body is retried by the transport like a 5xx
+        response = self._transport.get(url=url, validate=KabutanScraper.__is_complete)
+        response.raise_for_status()
+        if not KabutanScraper.__is_complete(response):
+            raise TruncatedResponse(url)
 
-        df['date'] = df.apply(lambda x: convert_to_datetime(x[0], x[6]), axis=1)
-        df = df.rename(columns={1: 'open', 2:'high', 3:'low', 4:'close', 5:'volume'}, inplace=False)
-        df = df.drop([0, 6,7,8,9,10,11], axis=1)   # Drop unneeded columns
+        # A complete body without any bar(only the dummy row, or nothing)
+        html = response.text
+        if '\n' not in html.strip():
+            raise DelistedCode(code=self.code)
+
+        return html
+
+    @staticmethod
+    def __is_complete(response):
+        """Whether the body ends with a whole row, the status is judged separately."""
+        if response.status_code != 200:
+            return True
+        body = response.content.rstrip()
+        if len(body) == 0:
+            return True
+
+        # The dummy first row and the last row have all the fields
+        first = body[:body.find(b'\n')] if b'\n' in body else body
+        last = body[body.rfind(b'\n') + 1:]
+        return all(row.count(b',') == KabutanScraper.FIELDS - 1 and not row.endswith(b',') for row in [first, last])
+
+    @staticmethod
+    def __parse_minutes(html, after=None, output='pandas'):
+        with phase('parse'):
+            csvStringIO = StringIO(html)
+            df = pd.read_csv(csvStringIO, sep=",", header=None)
+
+        with phase('dataframe'):
+            df = KabutanScraper.__build_minutes_dataframe(df, after)
+            return df if output == 'pandas' else frame_to_table(df, output)
+
+    @staticmethod
+    def __build_minutes_dataframe(df, after):
+        df = df.iloc[1:]    # Drop the first row, dummy data
+
+        # Combine the date(yyyy.mm.dd) and the time(/HH:MM) columns, localized to Asia/Tokyo
+        dates = pd.to_datetime(df[6].astype(str) + df[0].astype(str).str[-6:], format="%Y.%m.%d/%H:%M")
+        dates = pd.DatetimeIndex(dates).tz_localize(pytz.timezone('Asia/Tokyo'))
+
+        # Only keep the bars after the given time(polling mode).
+        if after is not None:
+            mask = dates > after
+            df = df.loc[mask]
+            dates = dates[mask]
 
         # Multiply 0.1 & typecasting(for decimal point is not displayed).
-        for col in ['open', 'high', 'low', 'close']:
-            df[col] = df[col].astype('int')
-            df[[col]] = df[[col]].apply(lambda x: (x * 0.1).astype(float))
+        prices = df[[1, 2, 3, 4]].to_numpy(dtype='int64') * 0.1
+
+        df = pd.DataFrame({
+            'open': prices[:, 0],
+            'high': prices[:, 1],
+            'low': prices[:, 2],
+            'close': prices[:, 3],
+            'volume': df[5].to_numpy(),
+        }, index=dates.rename('date'))
 
-        df = df.sort_values(by=['date'])
-        df = df.set_index('date')
+        df = df.sort_index()
         
-        return df
\ No newline at end of file
+        return df
@@ -1,61 +1,143 @@
 import time
 import json
-import requests
+import contextvars
 import email.utils
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from .transport import get_default_transport
+from .instrumentation import instrumented, phase
+
+# Use orjson for parsing the JSON if installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+TARGET_PRICE_COLUMNS = ['code', 'record_date', 'current_price', 'pbr_low', 'pbr_high', 'pbr_theory',
+                        'per_low', 'per_high', 'per_theory', 'target_price']
 
 
 class KabuyohoScraper(object):
 
-    def __init__(self, bcode):
+    def __init__(self, bcode, transport=None):
         self.__bcode = bcode.replace('.T', '')
+        self._transport = transport if transport is not None else get_default_transport()
+
+    @classmethod
+    @instrumented
+    def get_target_prices(cls, codes, state=None, max_workers=8, transport=None) -> tuple:
+        """Get the target prices of several codes concurrently.
+
+        Codes whose `Last-Modified` is unchanged since the previous run are requested conditionally
+        and skipped, `state` is updated with the `Last-Modified` of the fetched codes.
+
+        Args:
+            codes (list): Ticker symbols, e.g. `['7203.T', '6758.T']`.
+            state (dict): code -> `Last-Modified` of the previous run, updated in place.
+                Persist it(e.g. as json) between the runs for skipping the unchanged codes.
+            max_workers (int): Maximum number of concurrent requests.
+            transport (Transport): Transport shared by the requests, defaults to the default transport.
+
+        Returns:
+            tuple: A tuple containing:
+                - pd.DataFrame: Target prices of the updated codes, one row per code,
+                    same columns as `get_target_price`.
+                - dict: Mapping of failed code to the raised exception.
+
+        Example:
+            >>> state = dict()
+            >>> df, errors = KabuyohoScraper.get_target_prices(['7203.T', '6758.T'], state=state)
+            >>> df, errors = KabuyohoScraper.get_target_prices(['7203.T', '6758.T'], state=state)  # only the updated
+        """
+        if state is None:
+            state = dict()
+        if transport is None:
+            transport = get_default_transport()
+
+        def fetch(code):
+            scraper = cls(code, transport=transport)
+            try:
+                return scraper.__request_target_price(state.get(code)), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The requests of the workers are accounted to the call through a copy of the caller's context
+            contexts = [contextvars.copy_context() for _ in codes]
+            results = list(executor.map(lambda context, code: context.run(fetch, code), contexts, codes))
+
+        rows = list()
+        errors = dict()
+        for code, (row, error) in zip(codes, results):
+            if error is not None:
+                errors[code] = error
+            elif row is not None:
+                state[code] = row.pop('last_modified')
+                rows.append(row)
+
+        with phase('dataframe'):
+            df = pd.DataFrame(rows, columns=TARGET_PRICE_COLUMNS)
 
+        return df, errors
+
+    @instrumented
     def get_target_price(self) -> pd.DataFrame:
         """Get theory PB/R and PE/R market price from sbisec API.("https://img-sec.ifis.co.jp")
 
-        Returns: 
+        Returns:
             Dataframe including target price
 
         """
+        row = self.__request_target_price()
+        del row['last_modified']
+
+        with phase('dataframe'):
+            df = pd.DataFrame([row], columns=TARGET_PRICE_COLUMNS)
+
+        return df
+
+    def __request_target_price(self, last_modified=None):
+        """Request the target price, conditionally if the `Last-Modified` of the previous request is given.
+
+        Returns:
+            dict: The row of the target price with its `last_modified`, None if not modified.
+        """
         # `Request` without `Referer`` paramter will be blocked by the website.
         scraper_headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:104.0) Gecko/20100101 Firefox/104.0',
             'Referer': 'https://kabuyoho.jp/'
         }
+        if last_modified is not None:
+            scraper_headers['If-Modified-Since'] = last_modified
 
         # Put the url here while a timestamp is necessary.
         target_price_api = "https://img-sec.ifis.co.jp/graph/stock_chart_tp/{}.json?callback=tp{}&_={}".format(
             self.__bcode, self.__bcode, int(time.time() * 1000))
 
-        # Convert the response to json Object.
-        resp = requests.get(url=target_price_api, headers=scraper_headers)
+        resp = self._transport.get(url=target_price_api, headers=scraper_headers)
+        # Also skip if the server ignored the conditional request
+        if resp.status_code == 304 or (last_modified is not None and resp.headers.get('Last-Modified') == last_modified):
+            return None
+
         record_date = email.utils.parsedate_to_datetime(
             resp.headers['Last-Modified']).strftime("%Y-%m-%d")
-        html = resp.text
-        resp_raw = html.split("(", 1)[1].strip(")")
-        resp_json = json.loads(resp_raw)
 
-        # Extract the necessary data.
-        pbr_low = resp_json[0]['data'][0]['low']
-        pbr_high = resp_json[0]['data'][0]['high']
-        pbr_theory = resp_json[3]['data'][0]['y']
-        per_low = resp_json[1]['data'][0]['low']
-        per_high = resp_json[1]['data'][0]['high']
-        per_theory = resp_json[5]['data'][0]['y']
-        current_price = resp_json[2]['data'][0]['y']
-        target_price = resp_json[7]['data'][0]['y']
-
-        # Construct dataframe
-        df = pd.DataFrame(index=range(1))
-        df.insert(len(df.columns), 'code', self.__bcode + '.T')
-        df.insert(len(df.columns), 'record_date', record_date)
-        df.insert(len(df.columns), 'current_price', current_price)
-        df.insert(len(df.columns), 'pbr_low', pbr_low)
-        df.insert(len(df.columns), 'pbr_high', pbr_high)
-        df.insert(len(df.columns), 'pbr_theory', pbr_theory)
-        df.insert(len(df.columns), 'per_low', per_low)
-        df.insert(len(df.columns), 'per_high', per_high)
-        df.insert(len(df.columns), 'per_theory', per_theory)
-        df.insert(len(df.columns), 'target_price', target_price)
+        # Convert the response to json Object, the JSON is sliced out of the JSONP callback without decoding.
+        with phase('parse'):
+            content = resp.content
+            resp_json = json_loads(content[content.index(b'(') + 1:content.rindex(b')')])
 
-        return df
+        # Extract the necessary data.
+        return {
+            'code': self.__bcode + '.T',
+            'record_date': record_date,
+            'current_price': resp_json[2]['data'][0]['y'],
+            'pbr_low': resp_json[0]['data'][0]['low'],
+            'pbr_high': resp_json[0]['data'][0]['high'],
+            'pbr_theory': resp_json[3]['data'][0]['y'],
+            'per_low': resp_json[1]['data'][0]['low'],
+            'per_high': resp_json[1]['data'][0]['high'],
+            'per_theory': resp_json[5]['data'][0]['y'],
+            'target_price': resp_json[7]['data'][0]['y'],
+            'last_modified': resp.headers['Last-Modified'],
+        }
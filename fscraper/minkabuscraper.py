@@ -1,11 +1,29 @@
 import time
-import requests
+import contextvars
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
+from pandas.api.types import union_categoricals
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from .ratelimit import HostRateLimiter
+from .transport import get_default_transport
+from .instrumentation import instrumented, phase
+from .output import check_output, build_table
 
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:107.0) Gecko/20100101 Firefox/107.0',
-}
+# Use lxml for parsing the html if installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Only the nodes which are extracted are parsed into the tree.
+_NEWS_ABSTRACT_STRAINER = SoupStrainer('div', attrs={'class': 'cell'})
+_NEWS_STRAINER = SoupStrainer('div', attrs={'class': [
+    'md_index_article fsize_l', 
+    'flr', 
+    'md_box fsize_m md_normalize'
+]})
 
 
 class MinkabuScraper(object):
@@ -13,19 +31,108 @@ class MinkabuScraper(object):
 
     Attributes:
         code(str): ticker symbol
+        parser(str): html parser used by BeautifulSoup, 'lxml' if installed otherwise 'html.parser'
     """
 
-    def __init__(self, code: str):
+    BASE_URL = "https://minkabu.jp"
+
+    def __init__(self, code: str, transport=None, parser=None):
         self.code = code.replace('.T', '')
+        self.parser = parser if parser is not None else HTML_PARSER
+        self._transport = transport if transport is not None else get_default_transport()
+
+    @classmethod
+    @instrumented
+    def get_bulk_analysis(cls, codes, max_workers=8, transport=None) -> tuple:
+        """Get the Minkabu analysis data of several codes concurrently, with compact dtypes.
+
+        The market data(`n225` and `usdjpy`) shared by all the codes is returned once in its own frame,
+        instead of being repeated for every code.
+
+        Args:
+            codes (list): Ticker symbols, e.g. `['7203.T', '6758.T']`.
+            max_workers (int): Maximum number of concurrent requests.
+            transport (Transport): Transport shared by the requests, defaults to the default transport.
+
+        Returns:
+            tuple: A tuple containing:
+                - pd.DataFrame: Analysis data of all succeeded codes indexed by `(code, date)`, 
+                    see `get_analysis(compact=True)`, without `n225` and `usdjpy`.
+                - pd.DataFrame: `n225` and `usdjpy` indexed by date.
+                - dict: Mapping of failed code to the raised exception.
+
+        Example:
+            >>> df, market, errors = MinkabuScraper.get_bulk_analysis(['7203.T', '6758.T'])
+            >>> df.loc['7203.T'].join(market)
+        """
+        if transport is None:
+            transport = get_default_transport()
+
+        def fetch(code):
+            try:
+                return cls(code, transport=transport).__request_analysis(), None
+            except Exception as e:
+                return None, e
 
-    def get_analysis(self):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The requests of the workers are accounted to the call through a copy of the caller's context
+            contexts = [contextvars.copy_context() for _ in codes]
+            results = list(executor.map(lambda context, code: context.run(fetch, code), contexts, codes))
+
+        frames = dict()
+        markets = list()
+        errors = dict()
+        with phase('dataframe'):
+            for code, (raw_json, error) in zip(codes, results):
+                if error is not None:
+                    errors[code] = error
+                    continue
+                df = MinkabuScraper.__build_analysis(raw_json, compact=True)
+                markets.append(df.pop('n225').to_frame().join(df.pop('usdjpy')))
+                frames[code] = df
+
+            if len(frames) == 0:
+                return pd.DataFrame(), pd.DataFrame(), errors
+
+            # Concatenating categoricals with different categories would fall back to objects
+            for column in ['news', 'picks']:
+                categories = union_categoricals([df[column] for df in frames.values()]).categories
+                for df in frames.values():
+                    df[column] = df[column].cat.set_categories(categories)
+
+            df = pd.concat(frames, names=['code', 'date'])
+            market = pd.concat(markets)
+            market = market[~market.index.duplicated()].sort_index()
+
+        return df, market, errors
+
+    @instrumented
+    def get_analysis(self, compact=False, output='pandas'):
         """Get Minkabu analysis data from https://minkabu.jp/stock/code/analysis
 
+        Args:
+            compact (bool): Use compact dtypes, float32 for the prices, integer for the volume
+                and categorical for the news and picks.
+            output (str): 'pandas', 'arrow' for a `pyarrow.Table` or 'polars' for a `polars.DataFrame`. 
+                The Arrow and Polars tables are built from the decoded JSON arrays with a `date` column, 
+                the prices are float64 and the missing values null(`compact` only applies to pandas).
+
         Returns:
             pd.DataFrame: Analysis data including target price, theoretic_price and news, etc.
         """
+        check_output(output)
+
+        raw_json = self.__request_analysis()
+
+        with phase('dataframe'):
+            if output != 'pandas':
+                return build_table(MinkabuScraper.__decode_analysis_columns(raw_json), output)
+            df = MinkabuScraper.__build_analysis(raw_json, compact)
+        
+        return df
+
+    def __request_analysis(self):
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:107.0) Gecko/20100101 Firefox/107.0',
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'en-US,en;q=0.5',
             'Referer': 'https://minkabu.jp/',
@@ -40,26 +147,70 @@ class MinkabuScraper(object):
 
         url = f"https://assets.minkabu.jp/jsons/stock-jam/stocks/{self.code}/lump.json"
 
-        raw_json = requests.get(url, headers=headers).json()
+        response = self._transport.get(url, headers=headers)
+        with phase('parse'):
+            raw_json = response.json()
 
-        df = pd.DataFrame()
-        df['date'] = pd.to_datetime(raw_json['dates'])
-        df['close'] = pd.to_numeric(raw_json['stock']['closes'])
-        df['target_price'] = pd.to_numeric(raw_json['stock']['mk_prices'])
-        df['predict_price'] = pd.to_numeric(raw_json['stock']['picks_prices'])
-        df['theoretical_price'] = pd.to_numeric(
-            raw_json['stock']['theoretic_prices'])
-        df['volume'] = pd.to_numeric(raw_json['stock']['volumes'])
+        return raw_json
 
-        df['news'] = raw_json['stock']['news']
-        df['picks'] = raw_json['stock']['picks']
-        df['n225'] = pd.to_numeric(raw_json['n225']['closes'])
-        df['usdjpy'] = pd.to_numeric(raw_json['usdjpy']['closes'])
+    @staticmethod
+    def __decode_analysis_columns(raw_json):
+        """Decode the arrays of the analysis data, the prices as float64 whatever the values(`None` becomes NaN)."""
+        stock = raw_json['stock']
 
-        df = df.set_index('date')
-        
-        return df
+        def prices(values):
+            return np.asarray(values, dtype='float64')
+
+        return {
+            'date': np.array([date.replace('/', '-') for date in raw_json['dates']], dtype='datetime64[D]'),
+            'close': prices(stock['closes']),
+            'target_price': prices(stock['mk_prices']),
+            'predict_price': prices(stock['picks_prices']),
+            'theoretical_price': prices(stock['theoretic_prices']),
+            'volume': stock['volumes'],
+            'news': stock['news'],
+            'picks': stock['picks'],
+            'n225': prices(raw_json['n225']['closes']),
+            'usdjpy': prices(raw_json['usdjpy']['closes']),
+        }
+
+    @staticmethod
+    def __build_analysis(raw_json, compact):
+        stock = raw_json['stock']
+        if not compact:
+            df = pd.DataFrame()
+            df['date'] = pd.to_datetime(raw_json['dates'])
+            df['close'] = pd.to_numeric(stock['closes'])
+            df['target_price'] = pd.to_numeric(stock['mk_prices'])
+            df['predict_price'] = pd.to_numeric(stock['picks_prices'])
+            df['theoretical_price'] = pd.to_numeric(
+                stock['theoretic_prices'])
+            df['volume'] = pd.to_numeric(stock['volumes'])
+
+            df['news'] = stock['news']
+            df['picks'] = stock['picks']
+            df['n225'] = pd.to_numeric(raw_json['n225']['closes'])
+            df['usdjpy'] = pd.to_numeric(raw_json['usdjpy']['closes'])
+
+            return df.set_index('date')
+
+        def prices(values):
+            return pd.to_numeric(values).astype('float32')
+
+        # Missing volumes are kept as <NA> by the nullable integer
+        return pd.DataFrame({
+            'close': prices(stock['closes']),
+            'target_price': prices(stock['mk_prices']),
+            'predict_price': prices(stock['picks_prices']),
+            'theoretical_price': prices(stock['theoretic_prices']),
+            'volume': pd.array(pd.to_numeric(stock['volumes']), dtype='Int64'),
+            'news': pd.Categorical(stock['news']),
+            'picks': pd.Categorical(stock['picks']),
+            'n225': prices(raw_json['n225']['closes']),
+            'usdjpy': prices(raw_json['usdjpy']['closes']),
+        }, index=pd.DatetimeIndex(pd.to_datetime(raw_json['dates']), name='date'))
 
+    @instrumented
     def get_news_abstract(self):
         """Get the news abstract from minkabu
 
@@ -68,9 +219,10 @@ class MinkabuScraper(object):
         """
         url = f"https://minkabu.jp/stock/{self.code}/news"
 
-        response = requests.get(url, headers=headers)
+        response = self._transport.get(url)
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        with phase('parse'):
+            soup = BeautifulSoup(response.content, self.parser, parse_only=_NEWS_ABSTRACT_STRAINER)
         cells = soup.select("div[class='cell']")
 
         queries = list()
@@ -84,40 +236,84 @@ class MinkabuScraper(object):
 
         return queries
 
-    def get_news_contents(self, queries, sleep=2):
+    @instrumented
+    def get_news_contents(self, queries, sleep=2, max_workers=None, rate=0.5, burst=1, rate_limiter=None):
         """Get news content
 
         Args:
             queries(list): news list retrieved from `query_news()`
-            sleep(int): interval between data scraping(unit: second)
+            sleep(int): interval between data scraping(unit: second), serial mode only
+            max_workers(int): fetch the news concurrently with the number of workers, 
+                if not given the news are fetched one by one
+            rate(float): requests per second allowed to the host, concurrent mode only
+            burst(int): number of requests allowed at once to the host, concurrent mode only
+            rate_limiter(HostRateLimiter): shared rate limiter, overriding `rate` and `burst`
 
         Returns:
-            list: news, length is same as the queries
+            list: news, length and order are same as the queries. In concurrent mode, 
+                each news has an 'error' key which is None on success, or the error message 
+                of the failed article(whose other contents are None).
+
+        Example:
+            >>> news_list = ms.get_news_contents(queries, max_workers=4, rate=2)
         """
-        BASE_URL = "https://minkabu.jp"
+        if max_workers is not None:
+            if rate_limiter is None:
+                rate_limiter = HostRateLimiter(rate, burst)
+            return self.__get_news_contents_concurrently(queries, max_workers, rate_limiter)
 
         news_list = list()
         for query in queries:
-            news = dict()
-            url = BASE_URL + query['href']
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            title = soup.select("div[class='md_index_article fsize_l']")[
-                0].get_text('\n').strip()
-            publish_time = soup.select("div[class='flr']")[
-                0].get_text('\n').strip()[3:]
-            article = soup.select("div[class='md_box fsize_m md_normalize']")[
-                0].get_text('\n').strip()
-
-            news['id'] = query['id']
-            news['url'] = url
-            news['title'] = title
-            news['publish_time'] = publish_time
-            news['article'] = article
-
+            news = self.__get_news(query)
             news_list.append(news)
 
             time.sleep(sleep)
 
         return news_list
+
+    def __get_news_contents_concurrently(self, queries, max_workers, rate_limiter):
+        def fetch(query):
+            rate_limiter.acquire(self.BASE_URL)
+            try:
+                news = self.__get_news(query)
+                news['error'] = None
+            except Exception as e:
+                news = {
+                    'id': query['id'],
+                    'url': self.BASE_URL + query['href'],
+                    'title': None,
+                    'publish_time': None,
+                    'article': None,
+                    'error': "{}: {}".format(type(e).__name__, e),
+                }
+            return news
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # `map` keeps the order of the queries, the requests of the workers are accounted 
+            # to the call through a copy of the caller's context
+            contexts = [contextvars.copy_context() for _ in queries]
+            news_list = list(executor.map(lambda context, query: context.run(fetch, query), contexts, queries))
+
+        return news_list
+
+    def __get_news(self, query):
+        news = dict()
+        url = self.BASE_URL + query['href']
+        response = self._transport.get(url)
+        with phase('parse'):
+            soup = BeautifulSoup(response.content, self.parser, parse_only=_NEWS_STRAINER)
+
+        title = soup.select("div[class='md_index_article fsize_l']")[
+            0].get_text('\n').strip()
+        publish_time = soup.select("div[class='flr']")[
+            0].get_text('\n').strip()[3:]
+        article = soup.select("div[class='md_box fsize_m md_normalize']")[
+            0].get_text('\n').strip()
+
+        news['id'] = query['id']
+        news['url'] = url
+        news['title'] = title
+        news['publish_time'] = publish_time
+        news['article'] = article
+
+        return news
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Use pyarrow/polars for the Arrow-native outputs if installed
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import polars
+except ImportError:
+    polars = None
+
+OUTPUTS = ['pandas', 'arrow', 'polars']
+
+
+def check_output(output: str):
+    """Check the `output` argument of a scraper method, and that its library is installed.
+
+    Raises:
+        ValueError: If the output is not one of `OUTPUTS`.
+        ImportError: If pyarrow/polars is required but not installed.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Valid outputs are 'pandas', 'arrow' and 'polars', but {output} received.")
+    if output == 'arrow' and pyarrow is None:
+        raise ImportError("output='arrow' requires pyarrow, install it with `pip install fscraper[pyarrow]`.")
+    if output == 'polars' and polars is None:
+        raise ImportError("output='polars' requires polars, install it with `pip install fscraper[polars]`.")
+
+
+def build_table(columns: dict, output: str, timezone: str = 'Asia/Tokyo'):
+    """Build a `pyarrow.Table` or a `polars.DataFrame` from the decoded column arrays, without pandas.
+
+    The NumPy arrays are handed over without copy where the types allow it, and the lists(e.g. with None
+    for the missing values) become nullable columns. NaN becomes null. The `datetime64` columns are in UTC,
+    and converted to `timezone`.
+
+    Args:
+        columns (dict): name -> NumPy array or list.
+        output (str): 'arrow' or 'polars'.
+        timezone (str): Timezone of the timestamp columns.
+    """
+    if output == 'arrow':
+        arrays = dict()
+        for name, values in columns.items():
+            values = pyarrow.array(values, from_pandas=True)
+            if pyarrow.types.is_timestamp(values.type):
+                values = values.cast(pyarrow.timestamp(values.type.unit, tz=timezone))
+            arrays[name] = values
+        return pyarrow.table(arrays)
+
+    series = list()
+    for name, values in columns.items():
+        # Polars takes the timestamps in ms, us or ns only
+        if isinstance(values, np.ndarray) and values.dtype == np.dtype('datetime64[s]'):
+            values = values.astype('datetime64[ms]')
+        values = polars.Series(name, values, strict=False, nan_to_null=True)
+        if values.dtype == polars.Datetime:
+            values = values.dt.replace_time_zone('UTC').dt.convert_time_zone(timezone)
+        series.append(values)
+    return polars.DataFrame(series)
+
+
+def frame_to_table(df, output: str, timezone: str = 'Asia/Tokyo'):
+    """Build a `pyarrow.Table` or a `polars.DataFrame` from a DataFrame indexed by a tz-aware `DatetimeIndex`,
+    the index becomes the first column."""
+    columns = {df.index.name or 'date': df.index.tz_convert('UTC').tz_localize(None).to_numpy()}
+    for column in df.columns:
+        columns[column] = df[column].to_numpy()
+    return build_table(columns, output, timezone)
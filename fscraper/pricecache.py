@@ -0,0 +1,68 @@
+import os
+import pickle
+import tempfile
+import pandas as pd
+
+
+class PriceCache(object):
+    """Persistent on-disk cache of price history, used by `YahooFinanceScraper.get_stock_price2`.
+
+    Each code and interval is stored in its own pickle file together with the covered period,
+    so that later calls only need to fetch the missing tail.
+
+    Attributes:
+        directory(str): directory holding the cache files
+        overlap_days(int): number of days before the last cached bar to fetch again on refresh,
+            for picking up revised bars and dividends
+    """
+
+    def __init__(self, directory: str, overlap_days: int = 7):
+        self.directory = os.path.expanduser(directory)
+        self.overlap_days = overlap_days
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, code, interval):
+        return os.path.join(self.directory, "{}_{}.pkl".format(code, interval))
+
+    def load(self, code: str, interval: str):
+        """Load the cached entry of the code.
+
+        Args:
+            code (str): Ticker symbol.
+            interval (str): Interval of the price data.
+
+        Returns:
+            dict: `{'period1': int, 'period2': int, 'prices': pd.DataFrame}`, or None if not cached.
+        """
+        try:
+            with open(self._path(code, interval), 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, code: str, interval: str, period1: int, period2: int, prices: pd.DataFrame):
+        """Save the price data of the code, replacing the previous entry atomically.
+
+        Args:
+            code (str): Ticker symbol.
+            interval (str): Interval of the price data.
+            period1 (int): Start of the covered period(unix time).
+            period2 (int): End of the covered period(unix time).
+            prices (pd.DataFrame): Price data to store.
+        """
+        entry = {'period1': period1, 'period2': period2, 'prices': prices}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(code, interval))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def clear(self, code: str, interval: str):
+        """Remove the cached entry of the code."""
+        try:
+            os.remove(self._path(code, interval))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,67 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket rate limiter.
+
+    Attributes:
+        rate(float): tokens added per second
+        capacity(float): maximum number of tokens, i.e. the allowed burst
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """Take tokens from the bucket, blocking until they are available.
+
+        Args:
+            tokens (float): Number of tokens to take. Defaults to 1.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class HostRateLimiter(object):
+    """Rate limiter keeping one `TokenBucket` per host.
+
+    Attributes:
+        rate(float): requests per second allowed for each host
+        capacity(float): allowed burst for each host
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str):
+        """Wait until a request to the host of the url is allowed.
+
+        Args:
+            url (str): URL of the request.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+
+        bucket.acquire()
@@ -0,0 +1,209 @@
+import time
+import heapq
+import warnings
+import threading
+from datetime import datetime, date, timedelta, timezone
+from .ratelimit import TokenBucket
+from .kabutanscraper import KabutanScraper
+
+# Use jpholiday for the national holidays if installed
+try:
+    import jpholiday
+except ImportError:
+    jpholiday = None
+
+JST = timezone(timedelta(hours=9))
+
+# Trading sessions of the Tokyo Stock Exchange, (start, end) in minutes of the day
+TSE_SESSIONS = [(9 * 60, 11 * 60 + 30), (12 * 60 + 30, 15 * 60 + 30)]
+
+
+class MarketCalendar(object):
+    """Trading days and sessions of the Tokyo Stock Exchange.
+
+    Weekends, the year-end holidays(Dec 31 - Jan 3) and the given `holidays` are closed. The national
+    holidays are taken from `jpholiday`, installed with `pip install fscraper[jpholiday]`.
+
+    Attributes:
+        holidays(set): additional closed dates
+        sessions(list): trading sessions, `(start, end)` in minutes of the day(JST)
+        grace(float): seconds after the end of a session during which the closing bars are still collected
+    """
+
+    def __init__(self, holidays=None, sessions=None, grace: float = 120):
+        self.holidays = set(holidays or [])
+        if jpholiday is None and len(self.holidays) == 0:
+            warnings.warn("jpholiday is not installed and no holidays are given, "
+                          "the national holidays are treated as trading days.")
+        self.sessions = sessions if sessions is not None else TSE_SESSIONS
+        self.grace = grace
+
+    def is_trading_day(self, day: date) -> bool:
+        if day.weekday() >= 5 or day in self.holidays:
+            return False
+        if (day.month, day.day) in [(12, 31), (1, 1), (1, 2), (1, 3)]:
+            return False
+        if jpholiday is not None and jpholiday.is_holiday(day):
+            return False
+        return True
+
+    def is_open(self, now: datetime) -> bool:
+        """Whether `now`(tz-aware) is within a session(including the grace period)."""
+        now = now.astimezone(JST)
+        if not self.is_trading_day(now.date()):
+            return False
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        return any(start * 60 <= seconds < end * 60 + self.grace for start, end in self.sessions)
+
+    def next_open(self, now: datetime) -> datetime:
+        """The start of the session which is open at `now`, or the next one."""
+        now = now.astimezone(JST)
+        day = now.date()
+        while True:
+            if self.is_trading_day(day):
+                for start, end in self.sessions:
+                    opening = datetime(day.year, day.month, day.day, start // 60, start % 60, tzinfo=JST)
+                    if now < opening + timedelta(minutes=end - start, seconds=self.grace):
+                        return max(opening, now)
+            day += timedelta(days=1)
+
+
+class PollingScheduler(object):
+    """Keep a watchlist of codes up to date with the minute bars of Kabutan during the trading sessions.
+
+    Each code is polled by `KabutanScraper.poll_stock_price_by_minutes`, at an interval adapted to its activity:
+    halved when new bars are found, doubled otherwise, between `min_interval` and `max_interval`.
+    All the requests share a global budget of `rate` requests per second. The new bars are published
+    to `callback(code, df)` and/or `queue.put((code, df))`.
+
+    Attributes:
+        min_interval(float): shortest polling interval of a code in seconds
+        max_interval(float): longest polling interval of a code in seconds
+        calendar(MarketCalendar): trading days and sessions
+        errors(dict): code -> the last exception raised by its poll
+
+    Example:
+        >>> scheduler = PollingScheduler(['7203.T', '6758.T'], callback=lambda code, df: print(code, df), rate=2)
+        >>> thread = threading.Thread(target=scheduler.run)
+        >>> thread.start()
+        >>> scheduler.stop()
+    """
+
+    def __init__(self, codes, callback=None, queue=None, rate: float = 1, burst: int = 1,
+                 min_interval: float = 15, max_interval: float = 300, calendar: MarketCalendar = None,
+                 on_error=None, transport=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.calendar = calendar if calendar is not None else MarketCalendar()
+        self.errors = dict()
+        self._callback = callback
+        self._queue = queue
+        self._on_error = on_error
+        self._transport = transport
+        self._budget = TokenBucket(rate, burst)
+        self._scrapers = dict()
+        self._intervals = dict()
+        self._due = []      # heap of (due time, code)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        for code in codes:
+            self.add(code)
+
+    def add(self, code: str):
+        """Add a code to the watchlist, polled immediately."""
+        with self._lock:
+            if code in self._scrapers:
+                return
+            self._scrapers[code] = KabutanScraper(code, transport=self._transport)
+            self._intervals[code] = self.min_interval
+            heapq.heappush(self._due, (0, code))
+
+    def remove(self, code: str):
+        """Remove a code from the watchlist."""
+        with self._lock:
+            self._scrapers.pop(code, None)
+            self._intervals.pop(code, None)
+            self._due = [(due, due_code) for due, due_code in self._due if due_code != code]
+            heapq.heapify(self._due)
+
+    def poll_due(self, now: float = None) -> int:
+        """Poll the codes which are due at `now`(unix time).
+
+        Returns:
+            int: Number of polled codes.
+        """
+        now = time.time() if now is None else now
+
+        # Each due code is polled once, the rescheduled ones wait for the next call
+        due = []
+        with self._lock:
+            while len(self._due) > 0 and self._due[0][0] <= now:
+                due.append(heapq.heappop(self._due)[1])
+
+        polled = 0
+        for code in due:
+            scraper = self._scrapers.get(code)
+            if scraper is None:
+                continue    # removed
+            if self._stopped.is_set():
+                # Keep the remaining codes due
+                with self._lock:
+                    heapq.heappush(self._due, (now, code))
+                continue
+
+            self._budget.acquire()
+            self.__poll(code, scraper, now)
+            polled += 1
+
+        return polled
+
+    def __poll(self, code, scraper, now):
+        try:
+            df = scraper.poll_stock_price_by_minutes()
+        except Exception as e:
+            self.errors[code] = e
+            if self._on_error is not None:
+                self._on_error(code, e)
+            interval = self.max_interval
+        else:
+            self.errors.pop(code, None)
+            interval = self._intervals.get(code, self.min_interval)
+            if len(df) > 0:
+                interval = max(self.min_interval, interval / 2)
+                if self._callback is not None:
+                    self._callback(code, df)
+                if self._queue is not None:
+                    self._queue.put((code, df))
+            else:
+                interval = min(self.max_interval, interval * 2)
+
+        with self._lock:
+            if code in self._scrapers:
+                self._intervals[code] = interval
+                heapq.heappush(self._due, (self.__next_due(max(now, time.time()) + interval), code))
+
+    def __next_due(self, due):
+        """Defer the due time out of the lunch break, the nights and the holidays."""
+        due_time = datetime.fromtimestamp(due, JST)
+        if self.calendar.is_open(due_time):
+            return due
+        return self.calendar.next_open(due_time).timestamp()
+
+    def run(self):
+        """Poll the codes until `stop()` is called, sleeping while the market is closed."""
+        while not self._stopped.is_set():
+            now = time.time()
+            if not self.calendar.is_open(datetime.fromtimestamp(now, JST)):
+                self._stopped.wait(self.calendar.next_open(datetime.fromtimestamp(now, JST)).timestamp() - now)
+                continue
+
+            self.poll_due(now)
+
+            with self._lock:
+                wait = self._due[0][0] - time.time() if len(self._due) > 0 else self.max_interval
+            self._stopped.wait(max(wait, 0))
+
+    def stop(self):
+        """Stop `run()`."""
+        self._stopped.set()
@@ -0,0 +1,222 @@
+import os
+import json
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+
+class PriceStore(object):
+    """Columnar on-disk store of price history, loaded through memory-mapped files.
+
+    Each code and interval is stored in its own directory, with one fixed-width binary file per column
+    (`timestamp` as int64 nanoseconds since epoch(UTC), prices as float32/float64 and volume as int64)
+    and a `meta.json` holding the committed number of rows. Appends write the new rows past the committed
+    length and then replace `meta.json` atomically, so that readers never see a partial append.
+
+    Attributes:
+        directory(str): directory holding the stored codes
+        dtype(str): dtype of the float columns, 'float64' or 'float32'
+        tz(str): timezone of the loaded index, also used for localizing naive indexes on append
+
+    Example:
+        >>> store = PriceStore('~/.fscraper/store')
+        >>> store.append('7203.T', '1m', KabutanScraper('7203.T').get_stock_price_by_minutes())
+        >>> df = store.load('7203.T', '1m', start='2024-01-31 09:00', end='2024-01-31 11:30')
+    """
+
+    META = 'meta.json'
+
+    # Columns stored as int64 whatever their dtype, e.g. a volume with a missing value is float64 in pandas
+    INTEGER_COLUMNS = ['volume']
+
+    def __init__(self, directory: str, dtype: str = 'float64', tz: str = 'Asia/Tokyo'):
+        if dtype not in ['float64', 'float32']:
+            raise ValueError(f"Valid dtypes are 'float64' and 'float32', but {dtype} received.")
+
+        self.directory = os.path.expanduser(directory)
+        self.dtype = dtype
+        self.tz = tz
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, code, interval, name=None):
+        path = os.path.join(self.directory, code, interval)
+        return path if name is None else os.path.join(path, name)
+
+    def _read_meta(self, code, interval):
+        try:
+            with open(self._path(code, interval, self.META)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, code, interval, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=self._path(code, interval), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(meta, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(code, interval, self.META))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def append(self, code: str, interval: str, prices: pd.DataFrame) -> int:
+        """Append the prices newer than the last stored bar.
+
+        The columns of the first append define the stored columns, later appends must have the same columns.
+
+        Args:
+            code (str): Ticker symbol.
+            interval (str): Interval of the price data.
+            prices (pd.DataFrame): Price data indexed by date, e.g. from `get_stock_price(datetime_index=True)`
+                or `get_stock_price_by_minutes()`. `volume` and the integer columns are stored as int64,
+                the others as `dtype`.
+
+        Returns:
+            int: Number of appended rows.
+
+        Raises:
+            ValueError: If the columns differ from the stored ones, or an int64 column has missing values
+                (drop or fill them before appending).
+        """
+        index = prices.index
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.DatetimeIndex(pd.to_datetime(index))
+        if index.tz is None:
+            index = index.tz_localize(self.tz)
+        timestamps = index.values.astype('datetime64[ns]').view('int64')
+
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+
+        with self._lock:
+            meta = self._read_meta(code, interval)
+            if meta is None:
+                os.makedirs(self._path(code, interval), exist_ok=True)
+                columns = {'timestamp': 'int64'}
+                for name, dtype in prices.dtypes.items():
+                    integer = str(name) in self.INTEGER_COLUMNS or pd.api.types.is_integer_dtype(dtype)
+                    columns[str(name)] = 'int64' if integer else self.dtype
+                meta = {'length': 0, 'columns': columns}
+            elif set(meta['columns']) != {'timestamp', *map(str, prices.columns)}:
+                raise ValueError(f"Stored columns are {list(meta['columns'])[1:]}, "
+                                 f"but {list(prices.columns)} received.")
+
+            # Only the bars after the last stored one are appended
+            if meta['length'] > 0:
+                last = self._column(code, interval, 'timestamp', 'int64', meta['length'])[-1]
+                start = np.searchsorted(timestamps, last, side='right')
+            else:
+                start = 0
+            rows = order[start:]
+            if len(rows) == 0:
+                return 0
+
+            # Check all the columns before writing any of them
+            columns = dict()
+            for name, dtype in meta['columns'].items():
+                if name == 'timestamp':
+                    columns[name] = timestamps[start:]
+                    continue
+                values = prices[name].to_numpy()[rows]
+                if dtype == 'int64' and pd.isna(values).any():
+                    raise ValueError(f"Column {name} is stored as int64, but has missing values.")
+                columns[name] = values.astype(dtype)
+
+            for name, values in columns.items():
+                itemsize = np.dtype(meta['columns'][name]).itemsize
+                with open(self._path(code, interval, name), 'ab') as f:
+                    # Discard the rows left by an interrupted append
+                    f.truncate(meta['length'] * itemsize)
+                    f.write(np.ascontiguousarray(values).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            meta['length'] += len(rows)
+            self._write_meta(code, interval, meta)
+
+        return len(rows)
+
+    def _column(self, code, interval, name, dtype, length):
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        # Plain ndarray view of the mapping, the memmap subclass would leak into the results of pandas
+        return np.asarray(np.memmap(self._path(code, interval, name), dtype=dtype, mode='r', shape=(length,)))
+
+    def arrays(self, code: str, interval: str, start=None, end=None) -> dict:
+        """Get the stored columns in the time range, as read-only views of the memory-mapped files.
+
+        Args:
+            code (str): Ticker symbol.
+            interval (str): Interval of the price data.
+            start (str | pd.Timestamp): Start of the range(inclusive), naive times are in `tz`.
+            end (str | pd.Timestamp): End of the range(inclusive), naive times are in `tz`.
+
+        Returns:
+            dict: column name -> np.ndarray, `timestamp` in int64 nanoseconds since epoch(UTC),
+                None if the code is not stored.
+        """
+        meta = self._read_meta(code, interval)
+        if meta is None:
+            return None
+
+        length = meta['length']
+        columns = {name: self._column(code, interval, name, dtype, length)
+                   for name, dtype in meta['columns'].items()}
+
+        timestamps = columns['timestamp']
+        lower = 0 if start is None else np.searchsorted(timestamps, self._to_nanoseconds(start), side='left')
+        upper = length if end is None else np.searchsorted(timestamps, self._to_nanoseconds(end), side='right')
+
+        return {name: values[lower:upper] for name, values in columns.items()}
+
+    def load(self, code: str, interval: str, start=None, end=None) -> pd.DataFrame:
+        """Load the stored prices in the time range, the columns are backed by the memory-mapped files.
+
+        Args:
+            code (str): Ticker symbol.
+            interval (str): Interval of the price data.
+            start (str | pd.Timestamp): Start of the range(inclusive), naive times are in `tz`.
+            end (str | pd.Timestamp): End of the range(inclusive), naive times are in `tz`.
+
+        Returns:
+            pd.DataFrame: Prices indexed by a tz-aware `DatetimeIndex` named 'date',
+                None if the code is not stored.
+        """
+        columns = self.arrays(code, interval, start, end)
+        if columns is None:
+            return None
+
+        index = pd.DatetimeIndex(columns.pop('timestamp').view('datetime64[ns]'), name='date')
+        index = index.tz_localize('UTC').tz_convert(self.tz)
+
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def _to_nanoseconds(self, time):
+        time = pd.Timestamp(time)
+        if time.tz is None:
+            time = time.tz_localize(self.tz)
+        return time.value
+
+    def codes(self) -> list:
+        """List the stored `(code, interval)`."""
+        return sorted((code, interval) for code in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, code))
+                      for interval in os.listdir(os.path.join(self.directory, code))
+                      if os.path.exists(self._path(code, interval, self.META)))
+
+    def clear(self, code: str, interval: str):
+        """Remove the stored prices of the code."""
+        with self._lock:
+            meta = self._read_meta(code, interval)
+            if meta is None:
+                return
+            os.remove(self._path(code, interval, self.META))
+            for name in meta['columns']:
+                try:
+                    os.remove(self._path(code, interval, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,363 @@
+# fscraper/streaming.py
+
+"""*Provide stateful counterparts of the Technical Indicators in `fscraper.utils` for live bars.*
+
+Each indicator holds O(window) state and is updated with one new bar at a time in O(1) amortized,
+returning the same values as the corresponding batch function would return for the last bar.
+
+Example:
+    >>> rsi = StreamingRSI(periods=14)
+    >>> for price in df['close']:
+    ...     value = rsi.update(price)
+"""
+
+import math
+from collections import deque
+
+
+def _divide(a: float, b: float) -> float:
+    """Divide with the NumPy semantics(inf/nan instead of ZeroDivisionError)."""
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _RollingMean(object):
+    """Rolling mean over a fixed window, the same as `pd.Series.rolling(window).mean()`."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque()
+        self._nobs = 0
+        self._sum = 0.0
+        # Kahan summation, separated for the added and the removed values
+        self._compensation_add = 0.0
+        self._compensation_remove = 0.0
+
+    def update(self, value: float) -> float:
+        self._values.append(value)
+        if len(self._values) > self.window:
+            self._remove(self._values.popleft())
+        self._add(value)
+
+        if self._nobs < self.window:
+            return math.nan
+        return self._sum / self._nobs
+
+    def _add(self, value):
+        if value != value:
+            return
+        self._nobs += 1
+        y = value - self._compensation_add
+        t = self._sum + y
+        self._compensation_add = t - self._sum - y
+        self._sum = t
+
+    def _remove(self, value):
+        if value != value:
+            return
+        self._nobs -= 1
+        y = -value - self._compensation_remove
+        t = self._sum + y
+        self._compensation_remove = t - self._sum - y
+        self._sum = t
+
+
+class _RollingStd(object):
+    """Rolling sample standard deviation over a fixed window(Welford's method),
+    the same as `pd.Series.rolling(window).std()`."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque()
+        self._nobs = 0
+        self._mean = 0.0
+        self._ssqdm = 0.0
+        # Length of the run of equal values at the end, the variance of a constant window is exactly 0
+        self._same_count = 0
+        self._prev = math.nan
+
+    def update(self, value: float) -> float:
+        self._values.append(value)
+        if len(self._values) > self.window:
+            self._remove(self._values.popleft())
+        self._add(value)
+
+        if self._nobs < self.window:
+            return math.nan
+        if self._same_count >= self._nobs:
+            return 0.0
+        return math.sqrt(max(self._ssqdm / (self._nobs - 1), 0.0))
+
+    def _add(self, value):
+        if value != value:
+            self._same_count = 0
+            return
+        self._same_count = self._same_count + 1 if value == self._prev else 1
+        self._prev = value
+        self._nobs += 1
+        delta = value - self._mean
+        self._mean += delta / self._nobs
+        self._ssqdm += delta * (value - self._mean)
+
+    def _remove(self, value):
+        if value != value:
+            return
+        self._nobs -= 1
+        if self._nobs == 0:
+            self._mean = 0.0
+            self._ssqdm = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / self._nobs
+        self._ssqdm -= delta * (value - self._mean)
+
+
+class _RollingExtremum(object):
+    """Rolling max(or min) over a fixed window with a monotonic deque,
+    the same as `pd.Series.rolling(window).max()`."""
+
+    def __init__(self, window: int, is_max: bool = True):
+        self.window = window
+        self.is_max = is_max
+        self._candidates = deque()  # (position, value), values monotonic
+        self._nans = deque()        # positions of NaN values within the window
+        self._position = 0
+
+    def update(self, value: float) -> float:
+        position = self._position
+        self._position += 1
+
+        if value != value:
+            self._nans.append(position)
+        else:
+            if self.is_max:
+                while self._candidates and self._candidates[-1][1] <= value:
+                    self._candidates.pop()
+            else:
+                while self._candidates and self._candidates[-1][1] >= value:
+                    self._candidates.pop()
+            self._candidates.append((position, value))
+
+        # Drop the values which left the window
+        first = position - self.window + 1
+        while self._candidates and self._candidates[0][0] < first:
+            self._candidates.popleft()
+        while self._nans and self._nans[0] < first:
+            self._nans.popleft()
+
+        if first < 0 or self._nans:
+            return math.nan
+        return self._candidates[0][1]
+
+
+class _EMA(object):
+    """Exponential moving average, the same as `pd.Series.ewm(span, adjust=False, min_periods).mean()`."""
+
+    def __init__(self, span: int, min_periods: int = 0):
+        self.min_periods = min_periods
+        self._alpha = 1. / (1. + (span - 1) / 2.)
+        self._old_wt_factor = 1. - self._alpha
+        self._old_wt = 1.
+        self._weighted = math.nan
+        self._nobs = 0
+
+    def update(self, value: float) -> float:
+        is_observation = value == value
+        self._nobs += is_observation
+
+        if self._weighted == self._weighted:
+            self._old_wt *= self._old_wt_factor
+            if is_observation:
+                if self._weighted != value:
+                    self._weighted = (self._old_wt * self._weighted + self._alpha * value) / (self._old_wt + self._alpha)
+                self._old_wt = 1.
+        elif is_observation:
+            self._weighted = value
+
+        return self._weighted if self._nobs >= max(self.min_periods, 1) else math.nan
+
+
+class StreamingRSI(object):
+    """Incremental Relative Strength Index, see `calculate_rsi`.
+
+    Attributes:
+        periods(int): the number of periods for the RSI calculation
+    """
+
+    def __init__(self, periods: int = 14):
+        self.periods = periods
+        self._prev = math.nan
+        self._up = _RollingMean(periods)
+        self._down = _RollingMean(periods)
+
+    def update(self, price: float) -> float:
+        """Add a new price.
+
+        Args:
+            price (float): The latest price.
+
+        Returns:
+            float: The RSI of the latest price, NaN until enough prices were given.
+        """
+        delta = price - self._prev
+        self._prev = price
+
+        sma_up = self._up.update(max(delta, 0.0) if delta == delta else delta)
+        sma_down = self._down.update(abs(min(delta, 0.0)) if delta == delta else delta)
+
+        rs = _divide(sma_up, sma_down)
+        return 100 - (100 / (1 + rs))
+
+
+class StreamingStochasticOscillator(object):
+    """Incremental Stochastic Oscillator('%K' and '%D'), see `calculate_stochastic_oscillator`.
+
+    Attributes:
+        k_period(int): period for the fast stochastic indicator
+        d_period(int): period for the slow stochastic indicator
+    """
+
+    def __init__(self, k_period: int = 14, d_period: int = 3):
+        self.k_period = k_period
+        self.d_period = d_period
+        self._high = _RollingExtremum(k_period, is_max=True)
+        self._low = _RollingExtremum(k_period, is_max=False)
+        self._slow = _RollingMean(d_period)
+
+    def update(self, high: float, low: float, close: float) -> tuple:
+        """Add a new bar.
+
+        Args:
+            high (float): The high price of the latest bar.
+            low (float): The low price of the latest bar.
+            close (float): The closing price of the latest bar.
+
+        Returns:
+            tuple[float, float]: '%K' and '%D' of the latest bar.
+        """
+        k_high = self._high.update(high)
+        k_low = self._low.update(low)
+
+        fast = _divide(close - k_low, k_high - k_low) * 100
+        slow = self._slow.update(fast)
+
+        return fast, slow
+
+
+class StreamingBollingerBands(object):
+    """Incremental Bollinger Bands, see `calculate_bollinger_bands`.
+
+    Attributes:
+        smooth_period(int): the period of the simple moving average
+        standard_deviation(int): the number of standard deviations of the bands
+    """
+
+    def __init__(self, smooth_period: int = 20, standard_deviation: int = 2):
+        self.smooth_period = smooth_period
+        self.standard_deviation = standard_deviation
+        self._sma = _RollingMean(smooth_period)
+        self._std = _RollingStd(smooth_period)
+
+    def update(self, close: float) -> tuple:
+        """Add a new closing price.
+
+        Args:
+            close (float): The latest closing price.
+
+        Returns:
+            tuple[float, float]: The top and the bottom band of the latest price.
+        """
+        sma = self._sma.update(close)
+        std = self._std.update(close)
+
+        top = sma + std * self.standard_deviation
+        bottom = sma - std * self.standard_deviation
+
+        return top, bottom
+
+
+class StreamingMACD(object):
+    """Incremental Moving Average Convergence/Divergence, see `calculate_macd`.
+
+    Attributes:
+        short_periods(int): number of periods for the short-term EMA
+        long_periods(int): number of periods for the long-term EMA
+        signal_periods(int): number of periods for the signal line EMA
+    """
+
+    def __init__(self, short_periods: int = 12, long_periods: int = 26, signal_periods: int = 9):
+        self.short_periods = short_periods
+        self.long_periods = long_periods
+        self.signal_periods = signal_periods
+        self._short_ema = _EMA(short_periods, min_periods=short_periods)
+        self._long_ema = _EMA(long_periods, min_periods=long_periods)
+        self._signal_ema = _EMA(signal_periods, min_periods=signal_periods)
+
+    def update(self, close: float) -> tuple:
+        """Add a new closing price.
+
+        Args:
+            close (float): The latest closing price.
+
+        Returns:
+            tuple[float, float, float]: The MACD line, the signal line and the histogram of the latest price.
+        """
+        macd = self._short_ema.update(close) - self._long_ema.update(close)
+        macd_signal = self._signal_ema.update(macd)
+        macd_histogram = macd - macd_signal
+
+        return macd, macd_signal, macd_histogram
+
+
+class StreamingOBV(object):
+    """Incremental On Balance Volume, see `calculate_obv`."""
+
+    def __init__(self):
+        self._prev = math.nan
+        self._obv = 0.0
+
+    def update(self, close: float, volume: float) -> float:
+        """Add a new bar.
+
+        Args:
+            close (float): The latest closing price.
+            volume (float): The latest volume.
+
+        Returns:
+            float: The OBV of the latest bar.
+        """
+        delta = close - self._prev
+        self._prev = close
+
+        if delta == delta and delta != 0 and volume == volume:
+            self._obv += math.copysign(1.0, delta) * volume
+
+        return self._obv
+
+
+class StreamingHighLow(object):
+    """Incremental x days high/low price, see `get_x_days_high_low`.
+
+    Attributes:
+        window(int): window length for the high and low prices
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._high = _RollingExtremum(window, is_max=True)
+        self._low = _RollingExtremum(window, is_max=False)
+
+    def update(self, high: float, low: float) -> tuple:
+        """Add a new bar.
+
+        Args:
+            high (float): The high price of the latest bar.
+            low (float): The low price of the latest bar.
+
+        Returns:
+            tuple[float, float]: The highest and the lowest price within the window.
+        """
+        return self._high.update(high), self._low.update(low)
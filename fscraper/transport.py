@@ -0,0 +1,225 @@
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from .instrumentation import record_request
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:107.0) Gecko/20100101 Firefox/107.0',
+    'Accept-Encoding': 'gzip, deflate',
+    'Cache-Control': 'no-cache, max-age=0',
+    'Connection': 'keep-alive',
+}
+
+# Responses which are worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class Transport(object):
+    """Pooled HTTP transport shared by all the scrapers.
+
+    Keeps the connections alive per host, and retries failed requests with jittered exponential backoff.
+    With a `ResponseCache`, responses are cached on disk and concurrent requests for the same URL 
+    are collapsed into one in-flight request. With an `AdaptiveConcurrency`, the concurrent requests 
+    of each host are limited to what the host currently sustains, and with a `CircuitBreaker` 
+    the requests to an unhealthy host fail fast.
+
+    Attributes:
+        session(requests.Session): the underlying session
+        timeout(float | tuple): default `(connect, read)` timeout in seconds
+        retries(int): maximum number of retries of a request
+        backoff_factor(float): base of the exponential backoff in seconds
+        backoff_max(float): maximum backoff in seconds
+        cache(ResponseCache): response cache, None for no caching
+        concurrency(AdaptiveConcurrency): per-host limit of the concurrent requests, None for no limit
+        breaker(CircuitBreaker): per-host circuit breaker, None for no breaker
+
+    Example:
+        >>> transport = Transport(pool_maxsize=32, host_pool_maxsize={'query2.finance.yahoo.com': 64})
+        >>> transport = Transport(concurrency=AdaptiveConcurrency(), breaker=CircuitBreaker())
+        >>> yfs = YahooFinanceScraper('7203.T', transport=transport)
+        >>> kt = KabutanScraper('7203.T', transport=transport)
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 16, host_pool_maxsize: dict = None,
+                 timeout=(5, 30), retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 30,
+                 headers: dict = None, cache=None, concurrency=None, breaker=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self._inflight = dict()
+        self._inflight_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Dedicated connection pools for the specified hosts
+        for host, maxsize in (host_pool_maxsize or {}).items():
+            self.session.mount(f'https://{host}/', HTTPAdapter(pool_connections=1, pool_maxsize=maxsize))
+
+    def get(self, url: str, params: dict = None, headers: dict = None, timeout=None, 
+            validate=None) -> requests.Response:
+        """Send a GET request, retrying on connection errors and retryable status codes.
+
+        Args:
+            url (str): URL of the request.
+            params (dict): Query parameters.
+            headers (dict): Additional headers, merged with the default headers.
+            timeout (float | tuple): Overrides the default timeout.
+            validate (callable): `validate(response)` returns False for an invalid body(e.g. truncated), 
+                which is retried and accounted as a failure of the host like a 5xx.
+
+        Returns:
+            requests.Response: The response, the last one if all the retries failed.
+
+        Raises:
+            requests.RequestException: If the connection still fails after the retries.
+            CircuitOpen: If the circuit breaker of the host is open.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        if self.cache is None:
+            return self._send(url, params, headers, timeout, validate=validate)
+
+        key = self.cache.key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            record_request(url, entry['status'], len(entry['body']), 0.0, cache_hit=True)
+            return self.cache.to_response(entry)
+
+        # Single-flight: the first caller fetches, the concurrent ones wait for its result.
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._inflight[key] = _Call()
+
+        if not is_leader:
+            start = time.perf_counter()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            record_request(url, call.response.status_code, len(call.response.content),
+                           time.perf_counter() - start, cache_hit=True)
+            return call.response
+
+        try:
+            call.response = self._revalidate(key, entry, url, params, headers, timeout, validate)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.done.set()
+
+        return call.response
+
+    def _revalidate(self, key, entry, url, params, headers, timeout, validate):
+        """Fetch the url, conditionally if a stale entry is cached, and update the cache."""
+        if entry is not None:
+            headers = dict(headers or {})
+            cached_headers = CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in cached_headers:
+                headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+        response = self._send(url, params, headers, timeout, conditional=entry is not None, validate=validate)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(key, entry)
+            return self.cache.to_response(entry)
+        if response.status_code == 200 and (validate is None or validate(response)):
+            self.cache.put(key, response)
+
+        return response
+
+    def _send(self, url, params, headers, timeout, conditional=False, validate=None):
+        """Send the request with retries, a `304` of a conditional request is accounted as a cache hit."""
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.allow(host)
+            sent = self.concurrency.acquire(host) if self.concurrency is not None else None
+
+            # Whether the host answered normally, None if the request failed for another reason
+            healthy = None
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+                healthy = response.status_code not in RETRY_STATUS and (validate is None or validate(response))
+            except RETRY_EXCEPTIONS:
+                healthy = False
+                if attempt >= self.retries:
+                    record_request(url, None, 0, time.perf_counter() - start, retries=attempt)
+                    raise
+            finally:
+                if self.concurrency is not None:
+                    self.concurrency.release(host, sent, healthy)
+                if self.breaker is not None:
+                    self.breaker.record(host, healthy)
+
+            if healthy or attempt >= self.retries:
+                record_request(url, response.status_code, len(response.content), 
+                               time.perf_counter() - start, retries=attempt, 
+                               cache_hit=conditional and response.status_code == 304)
+                return response
+
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    def close(self):
+        """Close all the pooled connections."""
+        self.session.close()
+
+
+class _Call(object):
+    """An in-flight request shared by the concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    """Get the transport used by the scrapers created without a `transport`, created on first use."""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
+
+
+def set_default_transport(transport: Transport):
+    """Set the transport used by the scrapers created without a `transport`."""
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = transport
@@ -1,13 +1,74 @@
 # fscraper/utils.py
 
 """*Provide several functions for calculating Technical Indicators.*
+
+The indicator functions accept a `pd.Series` for one stock, or a wide `pd.DataFrame` / 2-D `np.ndarray` 
+(time x tickers) for computing all the columns in one call. Each column is calculated independently, 
+so leading NaNs of codes listed later do not affect the other columns.
+
+Example:
+    >>> closes = pd.concat({code: df['close'] for code, df in frames.items()}, axis=1)
+    >>> rsi = calculate_rsi(closes)
 """
 
+import numbers
+import functools
 import numpy as np
 import pandas as pd
 from datetime import datetime
 
 
+def _accept_wide(func):
+    """Let the indicator accept 2-D(time x tickers) NumPy arrays besides pandas objects.
+
+    NumPy inputs are wrapped as pandas objects and the results are returned as NumPy arrays.
+    """
+    def wrap(value):
+        if isinstance(value, np.ndarray):
+            return pd.DataFrame(value) if value.ndim == 2 else pd.Series(value)
+        return value
+
+    def unwrap(value):
+        if isinstance(value, tuple):
+            return tuple(unwrap(v) for v in value)
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            return value.to_numpy()
+        return value
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        is_numpy = any(isinstance(v, np.ndarray) for v in (*args, *kwargs.values()))
+        args = [wrap(v) for v in args]
+        kwargs = {k: wrap(v) for k, v in kwargs.items()}
+        result = func(*args, **kwargs)
+        return unwrap(result) if is_numpy else result
+
+    return wrapper
+
+
+def _kernels_for(engine: str):
+    """`fscraper._kernels` for the 'numba' engine, None for 'pandas'. Imported on demand, Numba is slow to import."""
+    if engine not in ['pandas', 'numba']:
+        raise ValueError(f"Valid engines are 'pandas' and 'numba', but {engine} received.")
+    if engine == 'pandas':
+        return None
+
+    from . import _kernels
+    return _kernels
+
+
+def _run_kernel(kernel, value, *args):
+    """Run a kernel of `fscraper._kernels` on a Series/DataFrame, the results are wrapped alike."""
+    results = kernel(value.to_numpy(dtype='float64'), *args)
+
+    def wrap(result):
+        if isinstance(value, pd.Series):
+            return pd.Series(result[:, 0], index=value.index, name=value.name)
+        return pd.DataFrame(result, index=value.index, columns=value.columns)
+
+    return tuple(wrap(r) for r in results) if isinstance(results, tuple) else wrap(results)
+
+
 def calculate_pearson_correlation(price1: pd.Series, price2: pd.Series) -> np.float64:
     """Calculate the Pearson Correlation between two given price series.
 
@@ -29,10 +90,142 @@ def calculate_pearson_correlation(price1: pd.Series, price2: pd.Series) -> np.fl
     return np.corrcoef(x, y)[1, 0]
 
 
+
+def _prepare_returns(prices: pd.DataFrame, window: int, dtype) -> tuple:
+    """Daily returns of the trailing window, demeaned with NaNs replaced by 0, together with the validity mask."""
+    returns = (prices / prices.shift(1) - 1).iloc[1:]
+    if window is not None:
+        returns = returns.iloc[-window:]
+
+    values = returns.to_numpy(dtype='float64')
+    mask = ~np.isnan(values)
+    # Demeaning doesn't change the correlation but reduces the cancellation error(float32 especially)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.nansum(values, axis=0) / mask.sum(axis=0)
+    values = np.where(mask, values - np.nan_to_num(means), 0.)
+
+    return values.astype(dtype), mask.astype(dtype)
+
+
+def _correlation_block(x_i, m_i, x_j, m_j, min_periods) -> np.ndarray:
+    """Pairwise-complete Pearson correlation between two blocks of columns."""
+    n = m_i.T @ m_j
+    sum_i = x_i.T @ m_j
+    sum_j = m_i.T @ x_j
+    sum_ii = (x_i * x_i).T @ m_j
+    sum_jj = m_i.T @ (x_j * x_j)
+    sum_ij = x_i.T @ x_j
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sum_ij - sum_i * sum_j
+        var_i = n * sum_ii - sum_i * sum_i
+        var_j = n * sum_jj - sum_j * sum_j
+        corr = np.clip(cov / np.sqrt(var_i * var_j), -1, 1)
+    corr[n < max(min_periods, 2)] = np.nan
+
+    return corr
+
+
+def calculate_correlation_matrix(prices: pd.DataFrame, 
+                                 window: int = None, 
+                                 min_periods: int = 20, 
+                                 block_size: int = 512, 
+                                 dtype: str = 'float64') -> pd.DataFrame:
+    """Calculate the Pearson Correlation matrix of the daily returns of all the given stocks.
+
+    The matrix is calculated in blocks of columns with matrix products, using the pairwise-complete 
+    observations of each pair(days where either stock has no return are skipped).
+
+    Args:
+        prices (pd.DataFrame): Wide DataFrame(time x tickers) of stock prices.
+        window (int, optional): Only use the trailing `window` returns. Defaults to the whole series.
+        min_periods (int, optional): Minimum number of overlapping returns, NaN otherwise. Defaults to 20.
+        block_size (int, optional): Number of columns calculated at once. Defaults to 512.
+        dtype (str, optional): 'float64' or 'float32'(half the memory, less precise). Defaults to 'float64'.
+
+    Returns:
+        pd.DataFrame: The N x N correlation matrix.
+
+    Example:
+        >>> corr = calculate_correlation_matrix(closes, window=250, dtype='float32')
+    """
+    values, mask = _prepare_returns(prices, window, dtype)
+    n_codes = values.shape[1]
+    corr = np.empty((n_codes, n_codes), dtype=dtype)
+
+    for i in range(0, n_codes, block_size):
+        x_i, m_i = values[:, i:i + block_size], mask[:, i:i + block_size]
+        # The matrix is symmetric, only the upper blocks are calculated.
+        for j in range(i, n_codes, block_size):
+            x_j, m_j = values[:, j:j + block_size], mask[:, j:j + block_size]
+            block = _correlation_block(x_i, m_i, x_j, m_j, min_periods)
+            corr[i:i + block_size, j:j + block_size] = block
+            corr[j:j + block_size, i:i + block_size] = block.T
+
+    return pd.DataFrame(corr, index=prices.columns, columns=prices.columns)
+
+
+def get_top_correlated(prices: pd.DataFrame, 
+                       k: int = 10, 
+                       window: int = None, 
+                       min_periods: int = 20, 
+                       block_size: int = 512, 
+                       dtype: str = 'float64') -> pd.DataFrame:
+    """Get the `k` most correlated stocks(daily returns) for each of the given stocks.
+
+    Same as `calculate_correlation_matrix` but only one block of rows is kept in memory at a time, 
+    the full N x N matrix is never materialized.
+
+    Args:
+        prices (pd.DataFrame): Wide DataFrame(time x tickers) of stock prices.
+        k (int, optional): Number of peers for each stock. Defaults to 10.
+        window (int, optional): Only use the trailing `window` returns. Defaults to the whole series.
+        min_periods (int, optional): Minimum number of overlapping returns. Defaults to 20.
+        block_size (int, optional): Number of stocks calculated at once. Defaults to 512.
+        dtype (str, optional): 'float64' or 'float32'. Defaults to 'float64'.
+
+    Returns:
+        pd.DataFrame: DataFrame indexed by `(code, rank)` with columns 'peer' and 'correlation', 
+            ordered by descending correlation.
+
+    Example:
+        >>> peers = get_top_correlated(closes, k=5, window=250)
+        >>> peers.loc['7203.T']
+    """
+    values, mask = _prepare_returns(prices, window, dtype)
+    n_codes = values.shape[1]
+    k = min(k, n_codes - 1)
+    codes = prices.columns.to_numpy()
+
+    peers = np.empty((n_codes, k), dtype='int64')
+    correlations = np.empty((n_codes, k), dtype=dtype)
+    for i in range(0, n_codes, block_size):
+        x_i, m_i = values[:, i:i + block_size], mask[:, i:i + block_size]
+        strip = _correlation_block(x_i, m_i, values, mask, min_periods)
+
+        # Exclude the stock itself and the pairs without enough observations.
+        rows = np.arange(strip.shape[0])
+        strip[rows, rows + i] = np.nan
+        strip = np.where(np.isnan(strip), -np.inf, strip)
+
+        top = np.argpartition(-strip, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(strip, top, axis=1)
+        order = np.argsort(-top_values, axis=1, kind='stable')
+        peers[i:i + block_size] = np.take_along_axis(top, order, axis=1)
+        correlations[i:i + block_size] = np.take_along_axis(top_values, order, axis=1)
+
+    correlations[np.isinf(correlations)] = np.nan
+    index = pd.MultiIndex.from_product([prices.columns, range(1, k + 1)], names=['code', 'rank'])
+    df = pd.DataFrame({'peer': codes[peers.ravel()], 'correlation': correlations.ravel()}, index=index)
+    df.loc[df['correlation'].isna(), 'peer'] = None
+
+    return df
+
+
 def calculate_beta(stock: pd.Series, 
                    index: pd.Series, 
                    start: str='1985-01-01', 
-                   end: str=datetime.now().strftime('%Y-%m-%d')) -> np.float64:
+                   end: str=None) -> np.float64:
     """Calculate the beta of a stock relative to a benchmark index over a specified period.
 
     Args:
@@ -50,6 +243,9 @@ def calculate_beta(stock: pd.Series,
     Example:
         >>> beta = calculate_beta(stock, index, '2020-01-01', '2024-01-01')
     """
+    if end is None:
+        end = datetime.now().strftime('%Y-%m-%d')
+
     # Daily returns (percentage returns[`df.pct_change()`] or log returns[`np.log(df/df.shift(1))`])
     stock_returns = stock.pct_change()
     index_returns = index.pct_change()
@@ -67,13 +263,94 @@ def calculate_beta(stock: pd.Series,
     return cov/var
 
 
-def calculate_rsi(price: pd.Series, periods: int = 14) -> pd.DataFrame:
+
+def _window_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Rolling sum along the first axis from the cumulative sums, partial sums for the first `window - 1` rows."""
+    cumsum = np.cumsum(values, axis=0)
+    result = cumsum.copy()
+    result[window:] -= cumsum[:-window]
+    return result
+
+
+def calculate_rolling_beta(stock, index: pd.Series, window=250, min_periods: int = None) -> tuple:
+    """Calculate the rolling beta and alpha of stocks relative to a benchmark index.
+
+    All the stocks and windows are calculated at once from the cumulative sums of the returns,
+    with pairwise-complete observations(days where either return is missing are skipped).
+
+    Args:
+        stock (pd.Series | pd.DataFrame): Time series of stock prices, or a wide DataFrame(time x tickers).
+        index (pd.Series): Time series of benchmark index prices (e.g., 'Nikkei 225': `^N225`).
+        window (int | list): Window length(s) in periods, e.g. `[60, 120, 250]`. Defaults to 250.
+        min_periods (int, optional): Minimum number of observations within the window, 
+            defaults to the window length.
+
+    Returns:
+        tuple: A tuple containing:
+            - beta: The rolling beta, same shape as `stock`. For several windows, 
+              the columns are a MultiIndex `(window, code)`.
+            - alpha: The rolling alpha(intercept of the daily returns regression), same shape as `beta`.
+
+    Example:
+        >>> beta, alpha = calculate_rolling_beta(closes, n225['close'], window=[60, 120, 250])
+        >>> beta[60]['7203.T']
+    """
+    # A single window may also be a NumPy integer, e.g. taken from an array of windows
+    if not isinstance(window, numbers.Integral):
+        results = [calculate_rolling_beta(stock, index, w, min_periods) for w in window]
+        beta = pd.concat([r[0] for r in results], axis=1, keys=list(window), names=['window'])
+        alpha = pd.concat([r[1] for r in results], axis=1, keys=list(window), names=['window'])
+        return beta, alpha
+
+    is_series = isinstance(stock, pd.Series)
+    stocks = stock.to_frame() if is_series else stock
+    if min_periods is None:
+        min_periods = window
+
+    # Daily returns, the index returns are calculated on its own calendar before alignment.
+    stock_returns = (stocks / stocks.shift(1) - 1).to_numpy(dtype='float64')
+    index_returns = (index / index.shift(1) - 1).reindex(stocks.index).to_numpy(dtype='float64')[:, None]
+
+    valid = ~np.isnan(stock_returns) & ~np.isnan(index_returns)
+    x = np.where(valid, index_returns, 0.)
+    y = np.where(valid, stock_returns, 0.)
+
+    n = _window_sum(valid.astype('float64'), window)
+    sum_x = _window_sum(x, window)
+    sum_y = _window_sum(y, window)
+    sum_xx = _window_sum(x * x, window)
+    sum_xy = _window_sum(x * y, window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_y / n
+        var = sum_xx - sum_x * sum_x / n
+        beta = cov / var
+        alpha = (sum_y - beta * sum_x) / n
+
+    insufficient = n < max(min_periods, 2)
+    beta[insufficient] = np.nan
+    alpha[insufficient] = np.nan
+
+    beta = pd.DataFrame(beta, index=stocks.index, columns=stocks.columns)
+    alpha = pd.DataFrame(alpha, index=stocks.index, columns=stocks.columns)
+    if is_series:
+        return beta.iloc[:, 0].rename(stock.name), alpha.iloc[:, 0].rename(stock.name)
+
+    return beta, alpha
+
+
+@_accept_wide
+def calculate_rsi(price: pd.Series, periods: int = 14, wilder: bool = False, engine: str = 'pandas') -> pd.DataFrame:
     """Calculate the Relative Strength Index (RSI) for the given price data.
 
     Args:
-        price (pd.Series): A Pandas Series representing stock prices.
+        price (pd.Series | pd.DataFrame): A Pandas Series representing stock prices, or a wide DataFrame(time x tickers).
         periods (int, optional): The number of periods to use for the RSI calculation. 
             Defaults to 14. Values should be bounded from 0 to 100.
+        wilder (bool, optional): Average the moves with Wilder's smoothing(EMA with `alpha=1/periods`) 
+            instead of the simple moving average. Defaults to False.
+        engine (str, optional): 'pandas' or 'numba'(the fused kernel of `fscraper._kernels`, same results). 
+            'numba' falls back to pandas if Numba is not installed. Defaults to 'pandas'.
 
     Returns:
         pd.DataFrame: A DataFrame containing the RSI values.
@@ -82,6 +359,10 @@ def calculate_rsi(price: pd.Series, periods: int = 14) -> pd.DataFrame:
         * RSI values greater than 80 indicate an overbought condition.
         * RSI values less than 20 indicate an oversold condition.
     """
+    kernels = _kernels_for(engine)
+    if kernels is not None and kernels.NUMBA:
+        return _run_kernel(kernels.rsi, price, periods, wilder)
+
     # Get up&down moves
     price_delta = price.diff(1)
 
@@ -89,30 +370,39 @@ def calculate_rsi(price: pd.Series, periods: int = 14) -> pd.DataFrame:
     up = price_delta.clip(lower=0)
     down = abs(price_delta.clip(upper=0))
 
-    # Use simple moving average
-    sma_up = up.rolling(window=periods).mean()
-    sma_down = down.rolling(window=periods).mean()
+    if wilder:
+        # Use Wilder's smoothing
+        average_up = up.ewm(alpha=1 / periods, adjust=False, min_periods=periods).mean()
+        average_down = down.ewm(alpha=1 / periods, adjust=False, min_periods=periods).mean()
+    else:
+        # Use simple moving average
+        average_up = up.rolling(window=periods).mean()
+        average_down = down.rolling(window=periods).mean()
 
     # RSI formula
-    rs = sma_up / sma_down
+    rs = average_up / average_down
     rsi = 100 - (100/(1 + rs))
 
     return rsi
 
 
+@_accept_wide
 def calculate_stochastic_oscillator(high: pd.Series, 
                                     low: pd.Series, 
                                     close: pd.Series, 
                                     k_period: int = 14, 
-                                    d_period: int = 3)->pd.DataFrame:
+                                    d_period: int = 3,
+                                    engine: str = 'pandas')->pd.DataFrame:
     """Calculate Stochastic Oscillator Index('%K' and '%D') for the given price data.
 
     Args:
-        high (pd.Series): Series of stock high prices.
-        low (pd.Series): Series of stock low prices.
-        close (pd.Series): Series of stock closing prices.
+        high (pd.Series | pd.DataFrame): Series of stock high prices, or a wide DataFrame(time x tickers).
+        low (pd.Series | pd.DataFrame): Series of stock low prices, aligned with `high`.
+        close (pd.Series | pd.DataFrame): Series of stock closing prices, aligned with `high`.
         k_period (int, optional): Period for the fast stochastic indicator. Defaults to 14.
         d_period (int, optional): Period for the slow stochastic indicator. Defaults to 3.
+        engine (str, optional): 'pandas' or 'numba'(the O(n) rolling max/min of `fscraper._kernels`, 
+            same results). 'numba' uses the NumPy kernels if Numba is not installed. Defaults to 'pandas'.
 
     Returns:
         pd.DataFrame: DataFrame with additional columns '%K' and '%D'.
@@ -122,24 +412,33 @@ def calculate_stochastic_oscillator(high: pd.Series,
         * '%K' crossing below '%D': sell signal
         * '%K' crossing above '%D': buy signal
     """
-    # Maximum value of previous 14 periods
-    k_high = high.rolling(k_period).max()
-    # Minimum value of previous 14 periods
-    k_low = low.rolling(k_period).min()
+    kernels = _kernels_for(engine)
+    if kernels is not None:
+        k_high = _run_kernel(kernels.rolling_max, high, k_period)
+        k_low = _run_kernel(kernels.rolling_min, low, k_period)
+    else:
+        # Maximum value of previous 14 periods
+        k_high = high.rolling(k_period).max()
+        # Minimum value of previous 14 periods
+        k_low = low.rolling(k_period).min()
 
     # %K(fast stochastic indicator) formula
     fast = ((close - k_low) / (k_high - k_low)) * 100
     # %D(slow" stochastic indicator)
-    slow = fast.rolling(d_period).mean()
+    if kernels is not None and kernels.NUMBA:
+        slow = _run_kernel(kernels.rolling_mean, fast, d_period)
+    else:
+        slow = fast.rolling(d_period).mean()
 
     return fast, slow
 
 
+@_accept_wide
 def calculate_bollinger_bands(close: pd.Series, smooth_period: int = 20, standard_deviation: int = 2) -> pd.DataFrame:
     """Calculate Bollinger Bands for the given stock price series.
 
     Args:
-        close (pd.Series): A Pandas Series representing the closing prices of a stock.
+        close (pd.Series | pd.DataFrame): A Pandas Series representing the closing prices of a stock, or a wide DataFrame(time x tickers).
         smooth_period (int, optional): The period over which to calculate the simple moving average (SMA). Defaults to 20.
         standard_deviation (int, optional): The number of standard deviations to use for the bands. Defaults to 2.
 
@@ -162,17 +461,24 @@ def calculate_bollinger_bands(close: pd.Series, smooth_period: int = 20, standar
     return top, bottom
 
 
-def calculate_macd(close: pd.Series, short_periods: int = 12, long_periods: int = 26, signal_periods: int = 9) -> tuple:
+@_accept_wide
+def calculate_macd(close: pd.Series, 
+                   short_periods: int = 12, 
+                   long_periods: int = 26, 
+                   signal_periods: int = 9, 
+                   engine: str = 'pandas') -> tuple:
     """Calculate the Moving Average Convergence/Divergence (MACD) for a given series of closing prices.
 
     Args:
-        close (pd.Series): Series of closing prices.
+        close (pd.Series | pd.DataFrame): Series of closing prices, or a wide DataFrame(time x tickers).
         short_periods (int, optional): Number of periods for the short-term EMA. Defaults to 12.
         long_periods (int, optional): Number of periods for the long-term EMA. Defaults to 26.
         signal_periods (int, optional): Number of periods for the signal line EMA. Defaults to 9.
+        engine (str, optional): 'pandas' or 'numba'(the EMAs in a single pass by the kernel of `fscraper._kernels`, 
+            same results). 'numba' falls back to pandas if Numba is not installed. Defaults to 'pandas'.
 
     Returns:
-        tuple: A tuple containing three pd.Series:
+        tuple: A tuple containing three pd.Series(pd.DataFrame for wide input):
             - macd: The MACD line.
             - macd_signal: The signal line.
             - macd_histogram: The MACD histogram.
@@ -182,6 +488,10 @@ def calculate_macd(close: pd.Series, short_periods: int = 12, long_periods: int
         - When the MACD line crosses below the signal line, it may indicate a sell signal.
         - A MACD histogram value around zero suggests a potential change in trend.
     """
+    kernels = _kernels_for(engine)
+    if kernels is not None and kernels.NUMBA:
+        return _run_kernel(kernels.macd, close, short_periods, long_periods, signal_periods)
+
     # Get the 12-day EMA of the closing price
     short_ema = close.ewm(span=short_periods, adjust=False,
                           min_periods=short_periods).mean()
@@ -202,13 +512,16 @@ def calculate_macd(close: pd.Series, short_periods: int = 12, long_periods: int
     return macd, macd_signal, macd_histogram
 
 
-def get_x_days_high_low(high: pd.Series, low: pd.Series, window: int) -> tuple:
+@_accept_wide
+def get_x_days_high_low(high: pd.Series, low: pd.Series, window: int, engine: str = 'pandas') -> tuple:
     """Get x days high/low price.
 
     Args:
-        high (pd.Series): High prices.
-        low (pd.Series): Low prices.
+        high (pd.Series | pd.DataFrame): High prices, or a wide DataFrame(time x tickers).
+        low (pd.Series | pd.DataFrame): Low prices, aligned with `high`.
         window (int): Window length for calculating high and low prices.
+        engine (str, optional): 'pandas' or 'numba'(the O(n) rolling max/min of `fscraper._kernels`, 
+            same results). 'numba' uses the NumPy kernels if Numba is not installed. Defaults to 'pandas'.
 
     Returns:
         tuple[pd.Series, pd.Series]: A tuple containing the highest and lowest prices for the given window.
@@ -216,15 +529,20 @@ def get_x_days_high_low(high: pd.Series, low: pd.Series, window: int) -> tuple:
     Example:
         >>> df['3-day-high'], df['3-day-low'] = get_x_days_high_low(df['high'], df['low'], window=3)
     """
+    kernels = _kernels_for(engine)
+    if kernels is not None:
+        return _run_kernel(kernels.rolling_max, high, window), _run_kernel(kernels.rolling_min, low, window)
+
     return high.rolling(window=window).max(), low.rolling(window=window).min()
 
 
+@_accept_wide
 def calculate_obv(close: pd.Series, volume: pd.Series) -> pd.Series:
     """Calculates the On Balance Volume (OBV).
 
     Args:
-        close (pd.Series): A pandas Series representing the closing prices.
-        volume (pd.Series): A pandas Series representing the day's volume.
+        close (pd.Series | pd.DataFrame): A pandas Series representing the closing prices, or a wide DataFrame(time x tickers).
+        volume (pd.Series | pd.DataFrame): A pandas Series representing the day's volume, aligned with `close`.
 
     Returns:
         pd.Series: A pandas Series containing the calculated OBV values.
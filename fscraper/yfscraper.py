@@ -1,9 +1,9 @@
 import json
-import pytz
-import requests
+import contextvars
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .constant_table import (   
     REPORT_TABLE
 )
@@ -12,28 +12,215 @@ from .exceptions import (
     InvalidFinancialReport,
     InvalidFinancialReportType
 )
+from .transport import get_default_transport
+from .instrumentation import instrumented, phase
+from .output import check_output, build_table, frame_to_table
 
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:104.0) Gecko/20100101 Firefox/104.0',
-    'Cache-Control': 'no-cache, max-age=0'
+# Columns of the tidy financial reports
+FINANCIALS_COLUMNS = ['code', 'report', 'report_type', 'item', 'date', 'value']
+
+# Longest range(seconds) of one chart request accepted by Yahoo for the intraday intervals
+INTRADAY_WINDOWS = {
+    '1m': 7 * 86400,
+    '2m': 60 * 86400,
+    '5m': 60 * 86400,
+    '15m': 60 * 86400,
+    '30m': 60 * 86400,
+    '90m': 60 * 86400,
+    '60m': 730 * 86400,
+    '1h': 730 * 86400,
 }
 
 
 class YahooFinanceScraper(object):
 
-    def __init__(self, code):
+    def __init__(self, code, transport=None, cache=None):
         self.code = code.upper()
-        self._session = requests.Session()
+        self._transport = transport if transport is not None else get_default_transport()
         self._statistics_dom = None
+        self._cache = cache
+
+    @classmethod
+    @instrumented
+    def get_stock_prices(cls, codes, start=None, end=None, period='1mo', interval='1d',
+                         datetime_index=False, layout='wide', max_workers=8, transport=None, cache=None) -> tuple:
+        """Download historical stock prices for several codes concurrently.
+
+        The requests are issued from a bounded thread pool sharing one pooled `Transport`. 
+        A failing code(e.g. delisted) is recorded in the error map instead of aborting the batch.
+
+        Args:
+            codes (list): Ticker symbols, e.g. `['7203.T', '6758.T']`.
+            start (str): Start date, format `yyyy-mm-dd`. If given, `get_stock_price2` is used, 
+                otherwise `get_stock_price` with `period`.
+            end (str): End date, format `yyyy-mm-dd`. Only used together with `start`.
+            period (str): Duration of the historical data, see `get_stock_price`.
+            interval (str): Frequency of the data points, see `get_stock_price`.
+            datetime_index (bool): Index by a tz-aware `DatetimeIndex`, see `get_stock_price`.
+            layout (str): 'wide' for MultiIndex columns `(code, field)`, 
+                'long' for a MultiIndex index `(code, date)`.
+            max_workers (int): Maximum number of concurrent requests.
+            transport (Transport): Transport shared by the requests, defaults to the default transport.
+            cache (PriceCache): Price cache used with `start`, see `get_stock_price2`.
+
+        Returns:
+            tuple: A tuple containing:
+                - pd.DataFrame: Prices of all succeeded codes.
+                - dict: Mapping of failed code to the raised exception.
+
+        Example:
+            >>> df, errors = YahooFinanceScraper.get_stock_prices(['7203.T', '6758.T'], period='1y')
+        """
+        if layout not in ['wide', 'long']:
+            raise ValueError(f"Valid layouts are 'wide' and 'long', but {layout} received.")
+
+        if transport is None:
+            transport = get_default_transport()
+
+        def fetch(code):
+            scraper = cls(code, transport=transport, cache=cache)
+            if start is None:
+                return scraper.get_stock_price(period=period, interval=interval, datetime_index=datetime_index)
+            return scraper.get_stock_price2(start=start, end=end, interval=interval, datetime_index=datetime_index)
+
+        frames = dict()
+        errors = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The requests of the workers are accounted to the call through a copy of the caller's context
+            futures = {executor.submit(contextvars.copy_context().run, fetch, code): code for code in codes}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    frames[code] = future.result()
+                except Exception as e:
+                    errors[code] = e
+
+        # Keep the order of the given codes
+        frames = {code: frames[code] for code in codes if code in frames}
+        if len(frames) == 0:
+            return pd.DataFrame(), errors
+
+        with phase('dataframe'):
+            if layout == 'wide':
+                df = pd.concat(frames, axis=1, names=['code', 'field']).sort_index()
+            else:
+                df = pd.concat(frames, names=['code', 'date'])
+
+        return df, errors
+
+    @classmethod
+    @instrumented
+    def get_bulk_financials(cls, codes, reports=None, report_types=None, max_workers=8, 
+                            transport=None) -> tuple:
+        """Download the financial reports of several codes concurrently, one request per code.
+
+        Args:
+            codes (list): Ticker symbols, e.g. `['7203.T', '6758.T']`.
+            reports (list): Reports to download, see `get_all_financials`.
+            report_types (list): Frequencies of the reports, see `get_all_financials`.
+            max_workers (int): Maximum number of concurrent requests.
+            transport (Transport): Transport shared by the requests, defaults to the default transport.
+
+        Returns:
+            tuple: A tuple containing:
+                - pd.DataFrame: Tidy reports of all succeeded codes, see `get_all_financials`.
+                - dict: Mapping of failed code to the raised exception.
+
+        Example:
+            >>> df, errors = YahooFinanceScraper.get_bulk_financials(['7203.T', '6758.T'])
+            >>> df[(df['report'] == 'incomestatement') & (df['item'] == 'NetIncome')]
+        """
+        if transport is None:
+            transport = get_default_transport()
 
+        def fetch(code):
+            return cls(code, transport=transport).get_all_financials(reports, report_types)
 
-    def get_financials(self, report, report_type) -> pd.DataFrame:
+        frames = dict()
+        errors = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The requests of the workers are accounted to the call through a copy of the caller's context
+            futures = {executor.submit(contextvars.copy_context().run, fetch, code): code for code in codes}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    frames[code] = future.result()
+                except Exception as e:
+                    errors[code] = e
+
+        # Keep the order of the given codes
+        frames = [frames[code] for code in codes if code in frames]
+        if len(frames) == 0:
+            return pd.DataFrame(columns=FINANCIALS_COLUMNS), errors
+
+        with phase('dataframe'):
+            df = pd.concat(frames, ignore_index=True)
+
+        return df, errors
+
+    @instrumented
+    def get_all_financials(self, reports=None, report_types=None) -> pd.DataFrame:
+        """Scrape several Yahoo! Finance financial reports in one request.
+
+        Args:
+            reports (list): Reports to scrape, any of 'incomestatement', 'balancesheet' 
+                and 'cashflow'. All of them by default.
+            report_types (list): Frequencies of the reports, any of 'quarterly' and 'annual'. 
+                Both of them by default.
+
+        Returns:
+            pd.DataFrame: Tidy reports with one row per reported value, 
+                columns `code`, `report`, `report_type`, `item`, `date` and `value`.
+
+        Example:
+            >>> df = yfs.get_all_financials(reports=['incomestatement', 'cashflow'], report_types=['annual'])
+            >>> df.pivot_table(index='item', columns='date', values='value')
+        """
+        reports = list(REPORT_TABLE.keys()) if reports is None else list(reports)
+        report_types = ['annual', 'quarterly'] if report_types is None else list(report_types)
+        for report in reports:
+            if report not in REPORT_TABLE.keys():
+                raise InvalidFinancialReport(report=report)
+        for report_type in report_types:
+            if report_type not in ['quarterly', 'annual']:
+                raise InvalidFinancialReportType(report_type=report_type)
+
+        # type(e.g. 'annualNetIncome') -> (report, report_type, item)
+        types = {report_type + item: (report, report_type, item)
+                 for report in reports for report_type in report_types for item in REPORT_TABLE[report]}
+
+        series = self.__request_timeseries(list(types))
+
+        with phase('dataframe'):
+            columns = {column: [] for column in FINANCIALS_COLUMNS}
+            for type_, (report, report_type, item) in types.items():
+                _, records = series.get(type_, ([], []))
+                for record in records:
+                    if record is None:
+                        continue
+                    columns['report'].append(report)
+                    columns['report_type'].append(report_type)
+                    columns['item'].append(item)
+                    columns['date'].append(record['asOfDate'])
+                    columns['value'].append(record['reportedValue']['raw'])
+            columns['code'] = [self.code] * len(columns['item'])
+
+            df = pd.DataFrame(columns)
+            df['date'] = pd.to_datetime(df['date'])
+
+        return df
+
+    @instrumented
+    def get_financials(self, report, report_type, output='pandas') -> pd.DataFrame:
         """Scrape Yahoo! Finance financial report.
 
         Args:
             report (str): Type of report to scrape. Options are 'incomestatement', 
                         'balancesheet', or 'cashflow'.
             report_type (str): Frequency of the report. Options are 'quarterly' or 'annual'.
+            output (str): 'pandas', 'arrow' for a `pyarrow.Table` or 'polars' for a `polars.DataFrame`. 
+                The Arrow and Polars tables have an `item` column and one column per date, 
+                the missing values are null instead of '-'.
 
         Returns:
             pd.DataFrame: DataFrame containing the requested financial report.
@@ -42,48 +229,75 @@ class YahooFinanceScraper(object):
         if report not in REPORT_TABLE.keys():
             raise InvalidFinancialReport(report=report)
         if report_type not in ['quarterly', 'annual']:
-            raise InvalidFinancialReportType(type=report_type)
+            raise InvalidFinancialReportType(report_type=report_type)
+        check_output(output)
 
         items = REPORT_TABLE[report]
         items = [report_type + item for item in items]
 
+        series = self.__request_timeseries(items)
+
+        with phase('dataframe'):
+            date_list = next(iter(series.values()))[0] if len(series) > 0 else []
+            date_list = [datetime.fromtimestamp(int(date)).strftime("%Y-%m-%d") for date in date_list]
+
+            if output != 'pandas':
+                # One float64 column per date whatever the values, the missing values(NaN) become null
+                records = [series.get(item, (date_list, [None] * len(date_list)))[1] for item in items]
+                columns = {'item': items}
+                for i, date in enumerate(date_list):
+                    columns[date] = np.asarray([item_records[i]['reportedValue']['raw'] if item_records[i] is not None
+                                                else None for item_records in records], dtype='float64')
+                return build_table(columns, output)
+
+            df = pd.DataFrame(columns=items)
+            df['date']=date_list
+            
+            for item in items:
+                _, records = series.get(item, (date_list, [None] * len(date_list)))
+                values = [record['reportedValue']['raw'] if record is not None else '-'  for record in records]
+
+                df[item]=values
+            
+            df = df.set_index('date').transpose()
+        
+        return df
+
+    def __request_timeseries(self, types):
+        """Request the fundamentals timeseries of the types.
+
+        Returns:
+            dict: type -> (timestamps, records), in the order of the response
+        """
         params = {
             'lang': 'en-US',
             'region': 'US',
             'symbol': f'{self.code}',
             'padTimeSeries': 'true',
-            'type': ','.join(items),
+            'type': ','.join(types),
             'merge': 'false',
             'period1': '493590046',
             'period2': f"{int(datetime.now().timestamp())}",
             'corsDomain': 'finance.yahoo.com',
         }
 
-        response = self._session.get(
+        response = self._transport.get(
             f'https://query2.finance.yahoo.com/ws/fundamentals-timeseries/v1/finance/timeseries/{self.code}',
             params=params,
-            headers=headers,
         )
-        raw = response.json()
+        with phase('parse'):
+            raw = response.json()
 
-        df = pd.DataFrame(columns=items)
+            # Index the results by their type in one pass
+            series = dict()
+            for result in raw['timeseries']['result']:
+                type_ = result['meta']['type'][0]
+                series[type_] = (result.get('timestamp', []), result.get(type_, []))
 
-        date_list = raw['timeseries']['result'][0]['timestamp']
-        date_list = [datetime.fromtimestamp(int(date)).strftime("%Y-%m-%d") for date in date_list]
-        df['date']=date_list
-        
-        for _, item in enumerate(items):
-            result = raw['timeseries']['result']
-            records = next((raw[item] for raw in result if item in raw), None)
-            values = [record['reportedValue']['raw'] if record is not None else '-'  for record in records]
-
-            df[item]=values
-        
-        df = df.set_index('date').transpose()
-        
-        return df
+        return series
 
-    def get_stock_price(self, period='1mo', interval='1d') -> pd.DataFrame:
+    @instrumented
+    def get_stock_price(self, period='1mo', interval='1d', datetime_index=False, output='pandas') -> pd.DataFrame:
         """Get historical stock price data.
 
         Args:
@@ -91,6 +305,10 @@ class YahooFinanceScraper(object):
                 Options include '1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max'.
             interval (str): Frequency of the data points. 
                 Options include '1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo'.
+            datetime_index (bool): Index the result by a tz-aware(Asia/Tokyo) `DatetimeIndex` 
+                instead of `yyyy-mm-dd HH:MM:SS` strings. Defaults to False.
+            output (str): 'pandas', 'arrow' for a `pyarrow.Table` or 'polars' for a `polars.DataFrame`. 
+                The Arrow and Polars tables are built from the decoded arrays, with a tz-aware `date` column.
 
         Returns:
             pd.DataFrame: A DataFrame containing the historical stock prices with columns such as 'open', 'high', 'low', 'close', 'volume', etc.
@@ -98,26 +316,50 @@ class YahooFinanceScraper(object):
         Raises:
             ValueError: If an invalid period or interval is provided.
         """
+        check_output(output)
+
         params = dict()
         params['range'] = period
         params['interval'] = interval
         params['events'] = 'div'
 
-        df = YahooFinanceScraper.__construct_price_dataframe(self, params)
+        df = YahooFinanceScraper.__construct_price_dataframe(self, params, datetime_index, output)
 
         return df
 
-    def get_stock_price2(self, start='', end = datetime.now().strftime('%Y-%m-%d'), interval='1d') -> pd.DataFrame:
+    @instrumented
+    def get_stock_price2(self, start='', end=None, interval='1d', 
+                         datetime_index=False, max_workers=4, output='pandas') -> pd.DataFrame:
         """Get history price with the specified date.
 
         Args:
             start (str): Start date, format `yyyy-mm-dd`.
             end (str): End date, format `yyyy-mm-dd`. Defaults to today's date.
             interval (str): Interval options include `1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo`.
+            datetime_index (bool): Index the result by a tz-aware(Asia/Tokyo) `DatetimeIndex` 
+                instead of `yyyy-mm-dd HH:MM:SS` strings. Defaults to False.
+            max_workers (int): Maximum number of concurrent requests of a split range.
+            output (str): 'pandas', 'arrow' for a `pyarrow.Table` or 'polars' for a `polars.DataFrame`, 
+                see `get_stock_price`.
 
         Returns:
             pd.DataFrame: DataFrame containing the stock price history.
+
+        Note:
+            * For the intraday intervals, a range longer than Yahoo accepts in one request(7 days for `1m`, 
+              60 days up to `90m`, 730 days for `60m`/`1h`) is split into windows fetched concurrently, 
+              and stitched into one frame. Yahoo still only serves the recent history of these intervals.
+            * If the scraper was created with a `PriceCache`, only the bars after the last cached bar 
+              (plus an overlap window) are downloaded.
+
+        Example:
+            >>> yfs = YahooFinanceScraper('7203.T', cache=PriceCache('~/.fscraper/prices'))
+            >>> df = yfs.get_stock_price2(start='2000-01-01')
         """
+        check_output(output)
+        if end is None:
+            end = datetime.now().strftime('%Y-%m-%d')
+
         params = dict()
         params['period1'] = int(datetime.strptime(
             start, "%Y-%m-%d").timestamp())
@@ -125,44 +367,149 @@ class YahooFinanceScraper(object):
         params['interval'] = interval
         params['events'] = 'div'
 
-        df = YahooFinanceScraper.__construct_price_dataframe(self, params)
+        if self._cache is not None:
+            df = YahooFinanceScraper.__get_cached_price(self, params, max_workers)
+            df = df.loc[(df.index >= pd.Timestamp(start, tz='Asia/Tokyo')) & 
+                        (df.index < pd.Timestamp(end, tz='Asia/Tokyo'))]
+            if output != 'pandas':
+                return frame_to_table(df, output)
+            return df if datetime_index else YahooFinanceScraper.__to_string_index(df)
+
+        df = YahooFinanceScraper.__construct_price_range(self, params, datetime_index, max_workers, output)
         
         return df
 
-    def __construct_price_dataframe(self, params):
-        df = pd.DataFrame()
+    def __construct_price_range(self, params, datetime_index=False, max_workers=4, output='pandas'):
+        """Request the prices of `[period1, period2)`, split into the windows accepted by Yahoo."""
+        window = INTRADAY_WINDOWS.get(params['interval'])
+        if window is None or params['period2'] - params['period1'] <= window:
+            return YahooFinanceScraper.__construct_price_dataframe(self, params, datetime_index, output)
+
+        windows = [dict(params, period1=period1, period2=min(period1 + window, params['period2']))
+                   for period1 in range(params['period1'], params['period2'], window)]
+
+        def fetch(window_params):
+            return YahooFinanceScraper.__construct_price_dataframe(self, window_params, True)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The requests of the workers are accounted to the call through a copy of the caller's context
+            contexts = [contextvars.copy_context() for _ in windows]
+            frames = list(executor.map(lambda context, w: context.run(fetch, w), contexts, windows))
+
+        with phase('dataframe'):
+            # The windows are in order, only the bars on their boundaries may be repeated
+            df = pd.concat(frames)
+            df = df.loc[~df.index.duplicated(keep='last')]
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
+            if output != 'pandas':
+                return frame_to_table(df, output)
+
+        return df if datetime_index else YahooFinanceScraper.__to_string_index(df)
+
+    def __get_cached_price(self, params, max_workers=4):
+        """Read the price data through the cache and fetch only the missing tail."""
+        interval = params['interval']
+        entry = self._cache.load(self.code, interval)
+
+        # Nothing usable in the cache, download the whole period.
+        if (entry is None or params['period1'] < entry['period1'] or len(entry['prices']) == 0 
+                or not isinstance(entry['prices'].index, pd.DatetimeIndex)):
+            df = YahooFinanceScraper.__construct_price_range(self, params, True, max_workers)
+            self._cache.save(self.code, interval, params['period1'], params['period2'], df)
+            return df
+
+        cached = entry['prices']
+        if params['period2'] <= entry['period2']:
+            return cached
+
+        # Re-fetch an overlap window before the last cached bar to pick up revised bars and dividends.
+        tail_params = dict(params)
+        tail_params['period1'] = int(cached.index[-1].timestamp()) - self._cache.overlap_days * 86400
+        tail = YahooFinanceScraper.__construct_price_range(self, tail_params, True, max_workers)
+
+        # The history was adjusted(e.g. stock split) if the overlapping bars changed, download it again.
+        common = cached.index.intersection(tail.index)
+        if not np.allclose(cached.loc[common, 'close'], tail.loc[common, 'close'], equal_nan=True):
+            full_params = dict(params)
+            full_params['period1'] = entry['period1']
+            df = YahooFinanceScraper.__construct_price_range(self, full_params, True, max_workers)
+            self._cache.save(self.code, interval, entry['period1'], params['period2'], df)
+            return df
+
+        if len(tail) > 0:
+            cached = cached.loc[cached.index < tail.index[0]]
+        df = pd.concat([cached, tail])
+        self._cache.save(self.code, interval, entry['period1'], params['period2'], df)
+
+        return df
+
+    @staticmethod
+    def __to_string_index(df):
+        """Convert the tz-aware `DatetimeIndex` to `yyyy-mm-dd HH:MM:SS` strings."""
+        df = df.copy()
+        df.index = pd.Index(df.index.strftime("%Y-%m-%d %H:%M:%S"), name='date')
+        return df
 
+    def __construct_price_dataframe(self, params, datetime_index=False, output='pandas'):
         url = "https://query2.finance.yahoo.com/v8/finance/chart/{}".format(
             self.code)
-        html = self._session.get(url=url, params=params,
-                            headers=headers).text
-        price_json = json.loads(html)
+        html = self._transport.get(url=url, params=params).text
+        with phase('parse'):
+            price_json = json.loads(html)
 
         if price_json['chart']['error'] is not None:
-            raise CodeNotFound(self.code, json.loads(html)[
-                                        'chart']['error']['description'])
-
-        df['date'] = price_json['chart']['result'][0]['timestamp']
-        df['open'] = price_json['chart']['result'][0]['indicators']['quote'][0]['open']
-        df['high'] = price_json['chart']['result'][0]['indicators']['quote'][0]['high']
-        df['low'] = price_json['chart']['result'][0]['indicators']['quote'][0]['low']
-        df['close'] = price_json['chart']['result'][0]['indicators']['quote'][0]['close']
-        # Bugs: At specific times, inappropriated values of 'volume' are returned.
-        df['volume'] = price_json['chart']['result'][0]['indicators']['quote'][0]['volume']
-
-        # Add dividends if exists.
-        try:
-            for _, item in price_json['chart']['result'][0]['events']['dividends'].items():
-                df.loc[df['date'] == item['date'],
-                       'dividends'] = item['amount']
-        except KeyError:
-            df['dividends'] = np.nan
+            raise CodeNotFound(self.code, price_json['chart']['error']['description'])
 
-        # Define the timezone for Asia/Tokyo
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
+        with phase('dataframe'):
+            result = price_json['chart']['result'][0]
+            if output != 'pandas':
+                return build_table(YahooFinanceScraper.__decode_price_columns(result), output)
+            df = YahooFinanceScraper.__build_price_dataframe(result, datetime_index)
 
-        df['date'] = df['date'].apply(lambda d: datetime.fromtimestamp(
-            int(d), tz=tokyo_tz).strftime("%Y-%m-%d %H:%M:%S"))
-        df = df.set_index('date')
+        return df
+
+    @staticmethod
+    def __decode_price_columns(result):
+        """Decode the arrays of a chart result, `date` as UTC `datetime64[s]`."""
+        # A range without any trading day has neither timestamps nor prices
+        quote = result['indicators']['quote'][0]
+        timestamps = np.asarray(result.get('timestamp', []), dtype='int64')
+
+        # `None` in the price arrays becomes NaN.
+        columns = {
+            'date': timestamps.astype('datetime64[s]'),
+            'open': np.asarray(quote.get('open', []), dtype='float64'),
+            'high': np.asarray(quote.get('high', []), dtype='float64'),
+            'low': np.asarray(quote.get('low', []), dtype='float64'),
+            'close': np.asarray(quote.get('close', []), dtype='float64'),
+            # Bugs: At specific times, inappropriated values of 'volume' are returned.
+            'volume': quote.get('volume', []),
+        }
+
+        # Add dividends if exists, joined by timestamp(every bar of a repeated timestamp gets the dividend).
+        dividends = np.full(len(timestamps), np.nan)
+        events = result.get('events', {}).get('dividends', {}).values()
+        if len(events) > 0:
+            amounts = {item['date']: item['amount'] for item in events}
+            dividends = pd.Series(timestamps).map(amounts).to_numpy(dtype='float64')
+        columns['dividends'] = dividends
+
+        return columns
+
+    @staticmethod
+    def __build_price_dataframe(result, datetime_index):
+        columns = YahooFinanceScraper.__decode_price_columns(result)
+
+        # Build the frame in one shot
+        dates = columns.pop('date')
+        df = pd.DataFrame(columns)
+
+        # Define the timezone for Asia/Tokyo
+        dates = pd.to_datetime(dates.astype('int64'), unit='s', utc=True).tz_convert('Asia/Tokyo')
+        if datetime_index:
+            df.index = dates.rename('date')
+        else:
+            df.index = pd.Index(dates.strftime("%Y-%m-%d %H:%M:%S"), name='date')
 
         return df
@@ -27,4 +27,12 @@ setup(
         'requests>=2.28.1',
         'beautifulsoup4>=4.12.2',
     ],
+    extras_require={
+        'lxml': ['lxml'],
+        'orjson': ['orjson'],
+        'jpholiday': ['jpholiday'],
+        'numba': ['numba'],
+        'pyarrow': ['pyarrow'],
+        'polars': ['polars'],
+    },
 )
@@ -1,9 +1,20 @@
+import sys
+import json
 import time
+import tempfile
 import unittest
+import datetime
+import subprocess
+import numpy as np
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
 import fscraper as fs
 from fscraper.exceptions import (
     CodeNotFound,
-    DelistedCode
+    DelistedCode,
+    TruncatedResponse,
+    CircuitOpen
 )
 
 class TestMethods(unittest.TestCase):
@@ -52,5 +63,778 @@ class TestMethods(unittest.TestCase):
             kt = fs.KabutanScraper('2412.T')
             kt.get_stock_price_by_minutes()
 
+
+class TestIndicators(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.close = pd.Series(1000 + np.cumsum(rng.normal(0, 5, 500))).round(1)
+        self.high = self.close + rng.uniform(0, 5, 500)
+        self.low = self.close - rng.uniform(0, 5, 500)
+        self.volume = pd.Series(rng.integers(0, 10000, 500))
+
+    def test_streaming_indicators(self):
+        """Streaming indicators should return the same values as the batch functions"""
+        rsi = fs.StreamingRSI()
+        macd = fs.StreamingMACD()
+        bands = fs.StreamingBollingerBands()
+        stochastic = fs.StreamingStochasticOscillator()
+        obv = fs.StreamingOBV()
+
+        streamed = [(rsi.update(c), *macd.update(c), *bands.update(c), *stochastic.update(h, l, c), obv.update(c, v))
+                    for h, l, c, v in zip(self.high, self.low, self.close, self.volume)]
+        expected = [fs.calculate_rsi(self.close),
+                    *fs.calculate_macd(self.close),
+                    *fs.calculate_bollinger_bands(self.close),
+                    *fs.calculate_stochastic_oscillator(self.high, self.low, self.close),
+                    fs.calculate_obv(self.close, self.volume)]
+
+        np.testing.assert_allclose(np.array(streamed), np.column_stack(expected))
+
+    def test_wide_indicators(self):
+        """Wide input should be calculated per column, including codes listed later"""
+        closes = pd.concat({'A': self.close, 'B': self.close.shift(100) * 2}, axis=1)
+
+        rsi = fs.calculate_rsi(closes)
+        macd, _, _ = fs.calculate_macd(closes.to_numpy())
+
+        pd.testing.assert_series_equal(rsi['B'], fs.calculate_rsi(closes['B']))
+        np.testing.assert_allclose(macd[:, 1], fs.calculate_macd(closes['B'])[0])
+
+    def test_rolling_beta(self):
+        """Rolling beta should match the covariance over the same window"""
+        index = self.close.rolling(3, min_periods=1).mean()
+        beta, _ = fs.calculate_rolling_beta(self.close, index, window=60)
+
+        returns = pd.concat([self.close.pct_change(), index.pct_change()], axis=1).iloc[-60:]
+        cov = returns.cov()
+        self.assertAlmostEqual(beta.iloc[-1], cov.iloc[0, 1] / cov.iloc[1, 1])
+
+        # NumPy integers are single windows, arrays several ones
+        pd.testing.assert_series_equal(fs.calculate_rolling_beta(self.close, index, window=np.int64(60))[0], beta)
+        betas, _ = fs.calculate_rolling_beta(self.close, index, window=np.array([60, 120]))
+        pd.testing.assert_series_equal(betas[60], beta, check_names=False)
+
+    def test_correlation_matrix(self):
+        """Blocked correlation should match pandas with pairwise-complete observations"""
+        closes = pd.concat({'A': self.close, 'B': self.high.shift(100), 'C': self.low}, axis=1)
+
+        corr = fs.calculate_correlation_matrix(closes, block_size=2)
+        expected = (closes / closes.shift(1) - 1).corr(min_periods=20)
+        np.testing.assert_allclose(corr.to_numpy(), expected.to_numpy())
+
+        peers = fs.get_top_correlated(closes, k=1, block_size=2)
+        self.assertEqual(peers.loc[('A', 1), 'peer'], expected['A'].drop('A').idxmax())
+
+    def test_numba_engine(self):
+        """The kernels should return exactly the same values as pandas, with or without Numba"""
+        close = self.close.copy()
+        close[100:105] = np.nan
+        close[300] = np.inf
+        close[400:420] = 1000.
+        closes = pd.concat({'A': close, 'B': close.shift(50) * 2}, axis=1)
+        highs, lows = closes + self.high - self.close, closes - self.close + self.low
+
+        for wilder in [False, True]:
+            pd.testing.assert_frame_equal(fs.calculate_rsi(closes, wilder=wilder, engine='numba'),
+                                          fs.calculate_rsi(closes, wilder=wilder), check_exact=True)
+        for actual, expected in zip(fs.calculate_macd(closes, 3, 5, 3, engine='numba'), fs.calculate_macd(closes, 3, 5, 3)):
+            pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+        for actual, expected in zip(fs.calculate_stochastic_oscillator(highs, lows, closes, engine='numba'),
+                                    fs.calculate_stochastic_oscillator(highs, lows, closes)):
+            pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+        for window in [1, 60, 500, 600]:
+            for actual, expected in zip(fs.get_x_days_high_low(highs['A'], lows['A'], window, engine='numba'),
+                                        fs.get_x_days_high_low(highs['A'], lows['A'], window)):
+                pd.testing.assert_series_equal(actual, expected, check_exact=True)
+
+        # The NumPy rolling max/min used without Numba
+        from fscraper import _kernels
+        np.testing.assert_array_equal(_kernels._rolling_extremum_numpy(_kernels._prep(closes), 60, False),
+                                      closes.rolling(60).min().to_numpy())
+
+        with self.assertRaises(ValueError):
+            fs.calculate_rsi(close, engine='cython')
+
+
+class TestAlignment(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        index = pd.date_range('2024-01-29 09:00', periods=3000, freq='min', tz='Asia/Tokyo', name='date')
+        index = index[rng.random(len(index)) > 0.3]
+        close = 1000 + np.cumsum(rng.normal(0, 1, len(index)))
+        self.bars = pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close + 0.5,
+                                  'volume': rng.integers(0, 1000, len(index))}, index=index)
+
+    def test_resample(self):
+        """Resampled bars should match pandas, and the cached ones the uncached"""
+        resampler = fs.Resampler(self.bars)
+        for rule, offset in [('5m', '5min'), ('15m', '15min'), ('1h', '1h'), ('1d', '1D')]:
+            expected = self.bars.resample(offset).agg(
+                {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+            expected = expected[self.bars['close'].resample(offset).count() > 0]
+            pd.testing.assert_frame_equal(fs.resample_ohlcv(self.bars, rule), expected,
+                                          check_freq=False, check_index_type=False)
+            pd.testing.assert_frame_equal(resampler.resample(rule), fs.resample_ohlcv(self.bars, rule))
+        self.assertIs(resampler.resample('5m'), resampler.resample('5m'))
+
+    def test_asof_join(self):
+        """Each bar should get the last daily value at or before it, within the tolerance"""
+        daily = pd.DataFrame({'target_price': [1.0, 2.0, 3.0]},
+                             index=pd.to_datetime(['2024-01-29', '2024-01-30', '2024-02-01']))
+        df = fs.asof_join(self.bars, daily, tolerance='1d')
+
+        self.assertTrue((df.loc['2024-01-29', 'target_price'] == 1.0).all())
+        self.assertTrue((df.loc['2024-01-30', 'target_price'] == 2.0).all())
+        self.assertTrue(df.loc['2024-01-31 00:01':, 'target_price'].isna().all())    # out of the tolerance
+        self.assertEqual(len(df), len(self.bars))
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_cache_key(self):
+        """Cache key should ignore the cache-busting timestamps and the order of the query"""
+        key = fs.ResponseCache.key
+        self.assertEqual(key('https://kabutan.jp/stock/read?c=7203&m=4&k=1&1700000000000='),
+                         key('https://kabutan.jp/stock/read', params={'k': '1', 'm': '4', 'c': '7203'}))
+        self.assertEqual(key('https://img-sec.ifis.co.jp/graph/stock_chart_tp/7203.json?callback=tp7203&_=1700000000000'),
+                         key('https://img-sec.ifis.co.jp/graph/stock_chart_tp/7203.json?callback=tp7203&_=1700000099999'))
+        self.assertNotEqual(key('https://kabutan.jp/stock/read?c=7203'), key('https://kabutan.jp/stock/read?c=6758'))
+
+    def test_retry(self):
+        """429/5xx and connection errors should be retried with backoff, the other statuses returned at once"""
+        outcomes = []
+        backoffs = []
+
+        def get(url, **kwargs):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            response = requests.Response()
+            response.status_code = outcome
+            response._content = b''
+            return response
+
+        transport = fs.Transport(retries=3, backoff_factor=0)
+        transport.session.get = get
+        transport._backoff = lambda attempt: backoffs.append(attempt) or 0
+
+        outcomes.extend([429, requests.ConnectionError(), 503, 200])
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 200)
+        self.assertEqual(backoffs, [0, 1, 2])
+
+        # The last response is returned once the retries are exhausted, 404 isn't retried
+        backoffs.clear()
+        outcomes.extend([500, 502, 504, 503, 404])
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 503)
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 404)
+        self.assertEqual(backoffs, [0, 1, 2])
+
+        outcomes.extend([requests.Timeout()] * 4)
+        with self.assertRaises(requests.Timeout):
+            transport.get('https://kabutan.jp/stock/read')
+
+        # Full jitter within the exponential bound
+        transport = fs.Transport(backoff_factor=0.5, backoff_max=4)
+        self.assertTrue(all(0 <= transport._backoff(attempt) <= min(4, 0.5 * 2 ** attempt) for attempt in range(10)))
+
+    def test_response_cache(self):
+        """Fresh responses should be served from the cache, stale ones revalidated and the oldest evicted"""
+        statuses = []
+        requested = []
+
+        def get(url, headers=None, **kwargs):
+            requested.append((url, dict(headers or {})))
+            time.sleep(0.05)
+            response = requests.Response()
+            response.status_code = statuses.pop(0) if statuses else 200
+            response.url = url
+            if response.status_code == 200:
+                response.headers['ETag'] = '"v1"'
+                response._content = b'x' * 40
+            else:
+                response._content = b''
+            return response
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = fs.ResponseCache(directory, ttl=60, max_bytes=100)
+            transport = fs.Transport(cache=cache)
+            transport.session.get = get
+
+            # Single-flight: the concurrent requests of a URL share one request
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                bodies = list(executor.map(lambda _: transport.get('https://kabutan.jp/a').content, range(4)))
+            self.assertEqual(bodies, [b'x' * 40] * 4)
+            self.assertEqual(len(requested), 1)
+
+            # Fresh within the TTL
+            self.assertTrue(transport.get('https://kabutan.jp/a').from_cache)
+            self.assertEqual(len(requested), 1)
+
+            # Stale after the TTL, revalidated by the ETag
+            cache.ttl = 0
+            statuses.append(304)
+            response = transport.get('https://kabutan.jp/a')
+            self.assertEqual((response.status_code, response.content), (200, b'x' * 40))
+            self.assertEqual(requested[-1][1]['If-None-Match'], '"v1"')
+
+            # Only the 2 most recently used bodies fit in 100 bytes
+            cache.ttl = 60
+            transport.get('https://kabutan.jp/b')
+            transport.get('https://kabutan.jp/a')
+            transport.get('https://kabutan.jp/c')
+            self.assertIsNone(cache.get(cache.key('https://kabutan.jp/b')))
+            self.assertIsNotNone(cache.get(cache.key('https://kabutan.jp/a')))
+            self.assertEqual(cache._total, 80)
+
+    def test_all_financials(self):
+        """All the requested reports should be fetched in one request and returned as a tidy frame"""
+        def result(type_, raw):
+            return {'meta': {'type': [type_]}, 'timestamp': [1711843200],
+                    type_: [{'asOfDate': '2024-03-31', 'reportedValue': {'raw': raw}}]}
+
+        body = {'timeseries': {'result': [result('annualNetIncome', 100), result('quarterlyNetIncome', 25)]}}
+        urls = []
+
+        def get(url, **kwargs):
+            urls.append(url)
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        df = fs.YahooFinanceScraper('7203.T', transport=transport).get_all_financials(reports=['incomestatement'])
+
+        self.assertEqual(len(urls), 1)
+        self.assertEqual(list(df.columns), ['code', 'report', 'report_type', 'item', 'date', 'value'])
+        self.assertEqual(df.set_index('report_type')['value'].to_dict(), {'annual': 100, 'quarterly': 25})
+
+    def test_batch_prices(self):
+        """Batch calls should keep the order of the codes, record the failed ones and emit one event"""
+        chart = {'chart': {'error': None, 'result': [{'timestamp': [1706659200, 1706745600], 'indicators': {
+            'quote': [{'open': [1.0, 2.0], 'high': [1.0, 2.0], 'low': [1.0, 2.0], 'close': [1.0, 2.0],
+                       'volume': [10, 20]}]}}]}}
+        not_found = {'chart': {'error': {'code': 'Not Found', 'description': 'No data found, symbol may be delisted'},
+                               'result': None}}
+        timeseries = {'timeseries': {'result': [{'meta': {'type': ['annualNetIncome']}, 'timestamp': [1711843200],
+                                                 'annualNetIncome': [{'asOfDate': '2024-03-31',
+                                                                      'reportedValue': {'raw': 100}}]}]}}
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            if '8369.T' in url:
+                response._content = json.dumps(not_found).encode() if 'chart' in url else b'<html>'
+            else:
+                response._content = json.dumps(chart if 'chart' in url else timeseries).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        codes = ['7203.T', '8369.T', '6758.T']
+        events = []
+        instrumentation = fs.get_instrumentation()
+        instrumentation.subscribe(events.append)
+        try:
+            wide, errors = fs.YahooFinanceScraper.get_stock_prices(codes, transport=transport)
+            long, _ = fs.YahooFinanceScraper.get_stock_prices(codes, layout='long', transport=transport)
+            financials, financials_errors = fs.YahooFinanceScraper.get_bulk_financials(
+                codes, reports=['incomestatement'], report_types=['annual'], transport=transport)
+        finally:
+            instrumentation.unsubscribe(events.append)
+
+        self.assertEqual(list(wide.columns.get_level_values('code').unique()), ['7203.T', '6758.T'])
+        self.assertEqual(wide[('7203.T', 'close')].tolist(), [1.0, 2.0])
+        self.assertEqual(list(errors), ['8369.T'])
+        self.assertIsInstance(errors['8369.T'], CodeNotFound)
+        self.assertEqual(long.index.names, ['code', 'date'])
+        self.assertEqual(list(long.index.get_level_values('code').unique()), ['7203.T', '6758.T'])
+        with self.assertRaises(ValueError):
+            fs.YahooFinanceScraper.get_stock_prices(codes, layout='tall', transport=transport)
+
+        self.assertEqual(list(financials['code'].unique()), ['7203.T', '6758.T'])
+        self.assertEqual(financials['value'].tolist(), [100, 100])
+        self.assertEqual(list(financials_errors), ['8369.T'])
+
+        self.assertEqual([event.name for event in events], ['YahooFinanceScraper.get_stock_prices'] * 2 +
+                         ['YahooFinanceScraper.get_bulk_financials'])
+        self.assertEqual([event.requests for event in events], [3, 3, 3])
+
+    def test_price_dataframe(self):
+        """The chart arrays should be joined with the dividends by timestamp, even if a timestamp is repeated"""
+        body = {'chart': {'error': None, 'result': [{
+            'timestamp': [1706659200, 1706745600, 1706745600, 1706832000],
+            'indicators': {'quote': [{'open': [1.0, 2.0, 2.0, None], 'high': [1.5, 2.5, 2.5, None],
+                                      'low': [0.5, 1.5, 1.5, None], 'close': [1.2, 2.2, 2.2, None],
+                                      'volume': [10, 20, 20, None]}]},
+            'events': {'dividends': {'1706745600': {'amount': 30.0, 'date': 1706745600},
+                                     '1706000000': {'amount': 10.0, 'date': 1706000000}}}}]}}
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        yfs = fs.YahooFinanceScraper('7203.T', transport=transport)
+
+        df = yfs.get_stock_price()
+        self.assertEqual(list(df.index), ['2024-01-31 09:00:00', '2024-02-01 09:00:00', '2024-02-01 09:00:00',
+                                          '2024-02-02 09:00:00'])
+        self.assertEqual(list(df.columns), ['open', 'high', 'low', 'close', 'volume', 'dividends'])
+        np.testing.assert_array_equal(df['dividends'].to_numpy(), [np.nan, 30.0, 30.0, np.nan])
+        self.assertTrue(df.iloc[-1][['open', 'high', 'low', 'close', 'volume']].isna().all())
+
+        df = yfs.get_stock_price(datetime_index=True)
+        self.assertEqual(str(df.index.tz), 'Asia/Tokyo')
+        self.assertEqual(df.index[0], pd.Timestamp('2024-01-31 09:00', tz='Asia/Tokyo'))
+
+    def test_price_cache(self):
+        """The cache should be filled once, refreshed by the tail only, and fetched again if the history changed"""
+        day = 86400
+        start = int(datetime.datetime(2024, 1, 1).timestamp())
+        closes = {start + i * day: 100. + i for i in range(60)}
+        requests_params = []
+
+        def get(url, params=None, **kwargs):
+            requests_params.append((params['period1'], params['period2']))
+            timestamps = [t for t in sorted(closes) if params['period1'] <= t < params['period2']]
+            prices = [closes[t] for t in timestamps]
+            body = {'chart': {'error': None, 'result': [{'timestamp': timestamps, 'indicators': {'quote': [
+                {'open': prices, 'high': prices, 'low': prices, 'close': prices, 'volume': [1] * len(prices)}]}}]}}
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        with tempfile.TemporaryDirectory() as directory:
+            yfs = fs.YahooFinanceScraper('7203.T', transport=transport, cache=fs.PriceCache(directory, overlap_days=7))
+
+            df = yfs.get_stock_price2(start='2024-01-01', end='2024-01-21', datetime_index=True)
+            self.assertEqual(requests_params, [(start, start + 20 * day)])
+            self.assertEqual(len(df), 20)
+
+            # Only the overlap window before the last cached bar and the new bars are requested
+            requests_params.clear()
+            df = yfs.get_stock_price2(start='2024-01-01', end='2024-01-31', datetime_index=True)
+            self.assertEqual(requests_params, [(start + 12 * day, start + 30 * day)])
+            self.assertEqual(list(df['close']), [100. + i for i in range(30)])
+
+            # A split changed the overlapping closes, the whole history is requested again
+            requests_params.clear()
+            closes.update({t: close / 2 for t, close in closes.items()})
+            df = yfs.get_stock_price2(start='2024-01-01', end='2024-02-10', datetime_index=True)
+            self.assertEqual(requests_params, [(start + 22 * day, start + 40 * day), (start, start + 40 * day)])
+            self.assertEqual(list(df['close']), [(100. + i) / 2 for i in range(40)])
+
+    def test_split_intraday_range(self):
+        """A long intraday range should be fetched in windows and stitched without the repeated boundary bars"""
+        windows = []
+
+        def get(url, params=None, **kwargs):
+            windows.append((params['period1'], params['period2']))
+            # One bar a day, including the bar at the end of the window
+            timestamps = list(range(params['period1'], params['period2'] + 1, 86400))
+            prices = [float(t) for t in timestamps]
+            body = {'chart': {'error': None, 'result': [{'timestamp': timestamps, 'indicators': {'quote': [
+                {'open': prices, 'high': prices, 'low': prices, 'close': prices, 'volume': [1] * len(prices)}]}}]}}
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        df = fs.YahooFinanceScraper('7203.T', transport=transport).get_stock_price2(
+            start='2024-01-01', end='2024-01-21', interval='1m', datetime_index=True)
+
+        start = int(datetime.datetime(2024, 1, 1).timestamp())
+        end = int(datetime.datetime(2024, 1, 21).timestamp())
+        week = 7 * 86400
+        self.assertEqual(sorted(windows), [(start, start + week), (start + week, start + 2 * week),
+                                           (start + 2 * week, end)])
+        self.assertEqual(len(df), 21)
+        self.assertTrue(df.index.is_unique and df.index.is_monotonic_increasing)
+
+    @unittest.skipIf(fs.output.pyarrow is None or fs.output.polars is None, 'pyarrow and polars are not installed')
+    def test_arrow_output(self):
+        """The Arrow and Polars outputs should hold the same values as pandas, with nulls for the missing ones"""
+        body = {'chart': {'error': None, 'result': [{'timestamp': [1706659200, 1706745600], 'indicators': {'quote': [
+            {'open': [1.0, None], 'high': [2.0, None], 'low': [0.5, None], 'close': [1.5, None], 'volume': [10, None]}]},
+            'events': {'dividends': {'1706745600': {'amount': 30.0, 'date': 1706745600}}}}]}}
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        yfs = fs.YahooFinanceScraper('7203.T', transport=transport)
+        expected = yfs.get_stock_price(datetime_index=True)
+
+        table = yfs.get_stock_price(output='arrow')
+        self.assertEqual(table.column_names, ['date', 'open', 'high', 'low', 'close', 'volume', 'dividends'])
+        self.assertEqual(str(table.schema.field('date').type), 'timestamp[s, tz=Asia/Tokyo]')
+        self.assertEqual(table.column('close').to_pylist(), [1.5, None])
+        self.assertEqual(table.column('volume').to_pylist(), [10, None])
+        self.assertEqual(table.column('dividends').to_pylist(), [None, 30.0])
+
+        df = yfs.get_stock_price(output='polars')
+        self.assertEqual(list(df['date'].dt.convert_time_zone('Asia/Tokyo')), list(expected.index.to_pydatetime()))
+        self.assertEqual(df['open'].to_list(), [1.0, None])
+        self.assertEqual(df['volume'].null_count(), 1)
+
+        with self.assertRaises(ValueError):
+            yfs.get_stock_price(output='numpy')
+
+    def test_target_prices(self):
+        """Codes whose Last-Modified is unchanged should be skipped on the next run"""
+        last_modified = 'Wed, 31 Jan 2024 09:00:00 GMT'
+        body = ('tp7203([{"data":[{"low":1,"high":2}]},{"data":[{"low":3,"high":4}]},{"data":[{"y":5}]},'
+                '{"data":[{"y":6}]},{},{"data":[{"y":7}]},{},{"data":[{"y":8}]}])')
+
+        def get(url, headers=None, **kwargs):
+            response = requests.Response()
+            if headers.get('If-Modified-Since') == last_modified:
+                response.status_code = 304
+            else:
+                response.status_code = 200
+                response.headers['Last-Modified'] = last_modified
+                response._content = body.encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        state = dict()
+        df, errors = fs.KabuyohoScraper.get_target_prices(['7203.T', '6758.T'], state=state, transport=transport)
+        self.assertEqual(list(df['code']), ['7203.T', '6758.T'])
+        self.assertEqual(list(df.iloc[0, 2:]), [5, 1, 2, 6, 3, 4, 7, 8])
+        self.assertEqual(errors, {})
+
+        state.pop('6758.T')
+        df, errors = fs.KabuyohoScraper.get_target_prices(['7203.T', '6758.T'], state=state, transport=transport)
+        self.assertEqual(list(df['code']), ['6758.T'])
+
+    def test_bulk_analysis(self):
+        """Bulk analysis should use compact dtypes and return the market data once"""
+        body = {'dates': ['2024/01/30', '2024/01/31'],
+                'stock': {'closes': [2800.5, 2810.0], 'mk_prices': [3000, 3010], 'picks_prices': [None, 2900],
+                          'theoretic_prices': [2700, 2710], 'volumes': [100, 200], 'news': [0, 1], 'picks': [0, 0]},
+                'n225': {'closes': [36000, 36100]}, 'usdjpy': {'closes': [147.5, 147.0]}}
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        df, market, errors = fs.MinkabuScraper.get_bulk_analysis(['7203.T', '6758.T'], transport=transport)
+
+        self.assertEqual(df.shape, (4, 7))
+        self.assertEqual(list(df.index.get_level_values('code').unique()), ['7203.T', '6758.T'])
+        self.assertEqual(df['close'].dtype, np.float32)
+        self.assertEqual(df['volume'].dtype, 'Int64')
+        self.assertEqual(df['news'].dtype, 'category')
+        self.assertEqual(list(market.columns), ['n225', 'usdjpy'])
+        self.assertEqual(len(market), 2)
+
+    def test_news_contents(self):
+        """Concurrent news should keep the order of the queries, with an error for a malformed article"""
+        page = ('<div class="md_index_article fsize_l">Title {0}</div><div class="flr">配信：2024/01/31 {0}:00</div>'
+                '<div class="md_box fsize_m md_normalize">Article {0}</div>')
+
+        def get(url, **kwargs):
+            news_id = int(url.rsplit('/', 1)[-1])
+            time.sleep(0.01 * (3 - news_id))     # the first queries finish last
+            response = requests.Response()
+            response.status_code = 200
+            response._content = (b'<html></html>' if news_id == 1 else page.format(news_id).encode())
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        queries = [{'id': str(i), 'href': f'/stock/7203/news/{i}'} for i in range(3)]
+        news = fs.MinkabuScraper('7203.T', transport=transport).get_news_contents(queries, max_workers=3, rate=1000)
+
+        self.assertEqual([item['id'] for item in news], ['0', '1', '2'])
+        self.assertEqual([item['title'] for item in news], ['Title 0', None, 'Title 2'])
+        self.assertEqual(news[2]['publish_time'], '2024/01/31 2:00')
+        self.assertIsNone(news[0]['error'])
+        self.assertTrue(news[1]['error'].startswith('IndexError'))
+        self.assertEqual(news[1]['url'], 'https://minkabu.jp/stock/7203/news/1')
+
+    def test_instrumentation(self):
+        """Each scraper call should emit one event accounting its requests and phases"""
+        csv = ("0,0,0,0,0,0,0,0,0,0,0,0\n"
+               "24/01/31/15:30,27860,27870,27839,27849,12794,2024.01.31,27849,236,0,0,0\n")
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.url = url
+            response._content = csv.encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        events = []
+        instrumentation = fs.get_instrumentation()
+        instrumentation.subscribe(events.append)
+        try:
+            fs.KabutanScraper('7203.T', transport=transport).get_stock_price_by_minutes()
+        finally:
+            instrumentation.unsubscribe(events.append)
+
+        self.assertEqual(len(events), 1)
+        event = events[0]
+        self.assertEqual(event.name, 'KabutanScraper.get_stock_price_by_minutes')
+        self.assertEqual((event.host, event.endpoint, event.status), ('kabutan.jp', '/stock/read', 200))
+        self.assertEqual((event.requests, event.bytes, event.retries), (1, len(csv), 0))
+        self.assertGreater(event.dataframe_time, 0)
+        self.assertIsNone(event.error)
+        self.assertIn(event.name, instrumentation.stats.summary())
+
+        # A failing callback is logged, and neither fails the call nor skips the other callbacks
+        def fail(event):
+            raise RuntimeError('callback failed')
+
+        events.clear()
+        instrumentation.subscribe(fail)
+        instrumentation.subscribe(events.append)
+        try:
+            with self.assertLogs('fscraper.instrumentation', level='ERROR'):
+                fs.KabutanScraper('7203.T', transport=transport).get_stock_price_by_minutes()
+        finally:
+            instrumentation.unsubscribe(fail)
+            instrumentation.unsubscribe(events.append)
+        self.assertEqual(len(events), 1)
+
+    def test_adaptive_concurrency(self):
+        """The limit should grow while used up and healthy, and be halved once per round of overloaded requests"""
+        concurrency = fs.AdaptiveConcurrency(initial=2, maximum=3)
+        host = 'kabutan.jp'
+
+        for _ in range(4):
+            sent = [concurrency.acquire(host) for _ in range(concurrency.limit(host))]
+            for t in sent:
+                concurrency.release(host, t, True)
+        self.assertEqual(concurrency.limit(host), 3)
+
+        sent = [concurrency.acquire(host) for _ in range(3)]
+        for t in sent:
+            concurrency.release(host, t, False)
+        self.assertEqual(concurrency.limit(host), 1)
+
+        # Requests failing for other reasons don't change the limit
+        concurrency.release(host, concurrency.acquire(host), None)
+        self.assertEqual(concurrency.limit(host), 1)
+
+    def test_circuit_breaker(self):
+        """Requests to an unhealthy host should fail fast until a trial request succeeds"""
+        statuses = []
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = statuses.pop(0)
+            response._content = b''
+            return response
+
+        breaker = fs.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        transport = fs.Transport(retries=0, breaker=breaker)
+        transport.session.get = get
+
+        statuses.extend([503, 503])
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 503)
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 503)
+        with self.assertRaises(CircuitOpen):
+            transport.get('https://kabutan.jp/stock/read')
+        self.assertEqual(breaker.state('kabutan.jp'), 'open')
+        self.assertEqual(breaker.state('minkabu.jp'), 'closed')
+
+        time.sleep(0.06)
+        statuses.append(200)
+        self.assertEqual(transport.get('https://kabutan.jp/stock/read').status_code, 200)
+        self.assertEqual(breaker.state('kabutan.jp'), 'closed')
+
+    def test_kabutan_errors(self):
+        """Truncated bodies should be retried, and only a complete body without bars means a delisted code"""
+        csv = ("0,0,0,0,0,0,0,0,0,0,0,0\n"
+               "24/01/31/15:30,27860,27870,27839,27849,12794,2024.01.31,27849,236,0,0,0\n")
+        bodies = []
+
+        def get(url, **kwargs):
+            status, body = bodies.pop(0)
+            response = requests.Response()
+            response.status_code = status
+            response._content = body.encode()
+            return response
+
+        transport = fs.Transport(retries=1, backoff_factor=0)
+        transport.session.get = get
+        kt = fs.KabutanScraper('7203.T', transport=transport)
+
+        bodies.extend([(200, csv[:40]), (200, csv)])
+        self.assertEqual(len(kt.get_stock_price_by_minutes()), 1)
+
+        bodies.extend([(200, csv[:-10]), (200, csv[:-10])])
+        with self.assertRaises(TruncatedResponse):
+            kt.get_stock_price_by_minutes()
+
+        bodies.extend([(503, ''), (503, '')])
+        with self.assertRaises(requests.HTTPError):
+            kt.get_stock_price_by_minutes()
+
+        bodies.extend([(200, '')])
+        with self.assertRaises(DelistedCode):
+            kt.get_stock_price_by_minutes()
+
+    def test_poll_minutes(self):
+        """A poll should only return the bars newer than the previous poll"""
+        bars = ["0,0,0,0,0,0,0,0,0,0,0,0",
+                "24/01/31/09:01,27860,27870,27839,27849,12794,2024.01.31,27849,236,0,0,0",
+                "24/01/31/09:00,27846,27862,27836,27860,30615,2024.01.31,27860,141,0,0,0"]
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = '\n'.join(bars).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        kt = fs.KabutanScraper('7203.T', transport=transport)
+
+        self.assertEqual(len(kt.poll_stock_price_by_minutes()), 2)
+        bars.insert(1, "24/01/31/09:02,27849,27880,27845,27875,10000,2024.01.31,27875,100,0,0,0")
+        df = kt.poll_stock_price_by_minutes()
+        self.assertEqual(list(df.index), [pd.Timestamp('2024-01-31 09:02', tz='Asia/Tokyo')])
+        self.assertEqual(df['close'].iloc[0], 2787.5)
+        self.assertEqual(len(kt.poll_stock_price_by_minutes()), 0)
+
+
+class TestStore(unittest.TestCase):
+
+    def test_append_and_load(self):
+        """Appends should skip the stored bars, and the loaded range should be backed by the files"""
+        index = pd.date_range('2024-01-31 09:00', periods=300, freq='min', tz='Asia/Tokyo', name='date')
+        rng = np.random.default_rng(0)
+        prices = pd.DataFrame({'close': rng.normal(1000, 10, 300), 'volume': rng.integers(0, 1000, 300)},
+                              index=index)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = fs.PriceStore(directory)
+            self.assertEqual(store.append('7203.T', '1m', prices.iloc[:200]), 200)
+            self.assertEqual(store.append('7203.T', '1m', prices.iloc[100:]), 100)
+            self.assertEqual(store.append('7203.T', '1m', prices), 0)
+
+            df = store.load('7203.T', '1m')
+            pd.testing.assert_frame_equal(df, prices, check_index_type=False, check_freq=False)
+
+            df = store.load('7203.T', '1m', start='2024-01-31 10:00', end='2024-01-31 10:29')
+            pd.testing.assert_frame_equal(df, prices.loc['2024-01-31 10:00':'2024-01-31 10:29'],
+                                          check_index_type=False, check_freq=False)
+            # Read-only views of the mapped files
+            self.assertFalse(df['close'].to_numpy().flags.writeable)
+            self.assertIsNone(store.load('6758.T', '1m'))
+
+    def test_volume_dtype(self):
+        """Volume should be stored as exact int64 even if float in pandas, and missing volumes rejected"""
+        index = pd.date_range('2024-01-31 09:00', periods=3, freq='min', tz='Asia/Tokyo', name='date')
+        prices = pd.DataFrame({'close': [1000., np.nan, 1001.], 'volume': [123456789., 5., np.nan]}, index=index)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = fs.PriceStore(directory, dtype='float32')
+            with self.assertRaises(ValueError):
+                store.append('7203.T', '1m', prices)
+            self.assertEqual(store.append('7203.T', '1m', prices.iloc[:2]), 2)
+
+            df = store.load('7203.T', '1m')
+            self.assertEqual(df['volume'].dtype, np.int64)
+            self.assertEqual(list(df['volume']), [123456789, 5])
+            with self.assertRaises(ValueError):
+                store.append('7203.T', '1m', prices)
+            self.assertEqual(len(store.load('7203.T', '1m')), 2)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_market_calendar(self):
+        """Lunch break, weekends, year-end and the given holidays should be closed"""
+        calendar = fs.MarketCalendar(holidays=[datetime.date(2024, 2, 12)])
+        jst = datetime.timezone(datetime.timedelta(hours=9))
+        self.assertTrue(calendar.is_open(datetime.datetime(2024, 2, 13, 9, 0, tzinfo=jst)))
+        self.assertTrue(calendar.is_open(datetime.datetime(2024, 2, 13, 11, 31, tzinfo=jst)))   # grace period
+        self.assertFalse(calendar.is_open(datetime.datetime(2024, 2, 13, 12, 0, tzinfo=jst)))
+        self.assertFalse(calendar.is_open(datetime.datetime(2024, 2, 12, 10, 0, tzinfo=jst)))
+        self.assertFalse(calendar.is_open(datetime.datetime(2024, 12, 31, 10, 0, tzinfo=jst)))
+        self.assertEqual(calendar.next_open(datetime.datetime(2024, 2, 13, 12, 0, tzinfo=jst)),
+                         datetime.datetime(2024, 2, 13, 12, 30, tzinfo=jst))
+        self.assertEqual(calendar.next_open(datetime.datetime(2024, 2, 9, 16, 0, tzinfo=jst)),
+                         datetime.datetime(2024, 2, 13, 9, 0, tzinfo=jst))
+
+    def test_polling(self):
+        """Only the new bars should be published, and the interval adapted to the activity"""
+        bars = ["0,0,0,0,0,0,0,0,0,0,0,0",
+                "24/01/31/09:01,27860,27870,27839,27849,12794,2024.01.31,27849,236,0,0,0",
+                "24/01/31/09:00,27846,27862,27836,27860,30615,2024.01.31,27860,141,0,0,0"]
+
+        def get(url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = '\n'.join(bars).encode()
+            return response
+
+        transport = fs.Transport()
+        transport.session.get = get
+        published = []
+        calendar = fs.MarketCalendar(holidays=[datetime.date(2024, 2, 12)])
+        scheduler = fs.PollingScheduler(['7203.T'], callback=lambda code, df: published.append((code, len(df))),
+                                        rate=1000, min_interval=10, max_interval=40, calendar=calendar,
+                                        transport=transport)
+
+        # Rescheduled after both the given time and the clock
+        now = max(time.time(), datetime.datetime(2030, 1, 8, 10, tzinfo=datetime.timezone.utc).timestamp())
+        self.assertEqual(scheduler.poll_due(now), 1)
+        self.assertEqual(published, [('7203.T', 2)])
+        self.assertEqual(scheduler.poll_due(now), 0)   # not due yet
+
+        # Each due code is polled once per call, however far the given time is
+        self.assertEqual(scheduler.poll_due(now + 7 * 24 * 3600), 1)
+        self.assertEqual(published, [('7203.T', 2)])
+        self.assertEqual(scheduler._intervals['7203.T'], 20)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_lazy_import(self):
+        """`import fscraper` should not load the heavy dependencies, and stay within the time budget"""
+        code = ("import sys, time; start = time.perf_counter(); import fscraper; "
+                "elapsed = time.perf_counter() - start; "
+                "print(elapsed, *[m for m in ('pandas', 'numpy', 'requests', 'bs4', 'pytz') if m in sys.modules])")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        elapsed, *loaded = output.split()
+
+        self.assertEqual(loaded, [])
+        self.assertLess(float(elapsed), 0.05)
+
+    def test_public_names(self):
+        """Public names should be resolved on first access"""
+        for name in fs.__all__:
+            self.assertIs(getattr(fs, name), getattr(getattr(fs, fs._EXPORTS[name]), name))
+        self.assertIn('calculate_rsi', dir(fs))
+        with self.assertRaises(AttributeError):
+            fs.not_exist
+
 if __name__ == '__main__':
     unittest.main()